@@ -672,6 +672,16 @@ export const checkProctoringHealth = async () => {
   return await response.json();
 };
 
+// Starts the proctoring server's retention clock so the exam's in-memory state is released
+export const endProctoringExam = async (examId) => {
+  const response = await fetch('http://localhost:5000/end-exam', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ exam_id: examId })
+  });
+  return await response.json();
+};
+
 export const analyzeProctoringFrame = async (imageData) => {
   const response = await fetch('http://localhost:5000/detect-faces', {
     method: 'POST',
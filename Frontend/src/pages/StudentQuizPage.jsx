@@ -794,6 +794,27 @@ const CameraComponent = React.memo(({
   const [camOn, setCamOn] = useState(true);
   
   const captureIntervalRef = useRef(null);
+  const captureFrameRef = useRef(null);
+  // Capture interval, width and JPEG quality - the proctoring server recommends these per student
+  const samplingRef = useRef({ intervalMs: 3000, width: null, quality: 0.8 });
+
+  // Apply the server's sampling recommendation (from the /detect response or the socket event)
+  const applySamplingRecommendation = useCallback((recommendation) => {
+    if (!recommendation?.intervalMs) return;
+
+    const previousInterval = samplingRef.current.intervalMs;
+    samplingRef.current = {
+      intervalMs: recommendation.intervalMs,
+      width: recommendation.width || null,
+      quality: recommendation.quality || 0.8
+    };
+
+    if (recommendation.intervalMs !== previousInterval && captureIntervalRef.current) {
+      clearInterval(captureIntervalRef.current);
+      captureIntervalRef.current = setInterval(() => captureFrameRef.current?.(), recommendation.intervalMs);
+      console.log(`🎚️ Proctoring sampling: every ${recommendation.intervalMs} ms at ${recommendation.width || 'native'}px`);
+    }
+  }, []);
 
   const getDetectionTypeFromActivity = (activity) => {
     if (activity.includes('TAB')) return 'tab_switching';
@@ -821,16 +842,20 @@ const CameraComponent = React.memo(({
       const video = videoRef.current;
       if (video.videoWidth === 0 || video.videoHeight === 0) return;
 
+      // Downscale to the recommended width, never upscale
+      const { width: targetWidth, quality } = samplingRef.current;
+      const scale = targetWidth ? Math.min(1, targetWidth / video.videoWidth) : 1;
+
       const canvas = document.createElement('canvas');
-      canvas.width = video.videoWidth;
-      canvas.height = video.videoHeight;
+      canvas.width = Math.round(video.videoWidth * scale);
+      canvas.height = Math.round(video.videoHeight * scale);
       const ctx = canvas.getContext('2d');
       
       ctx.translate(canvas.width, 0);
       ctx.scale(-1, 1);
       ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
       
-      const imageData = canvas.toDataURL('image/jpeg', 0.8);
+      const imageData = canvas.toDataURL('image/jpeg', quality);
       
       const studentSocketId = socketRef.current?.id || 'unknown-socket';
         
@@ -869,6 +894,7 @@ const CameraComponent = React.memo(({
       
     if (response.ok) {
       const results = await response.json();
+      applySamplingRecommendation(results.sampling);
       
       if (results.suspiciousActivities && results.suspiciousActivities.length > 0) {
         // ✅ BAGONG LOGIC: FOR ASYNC EXAMS - ALL DETECTIONS ARE ACTIVE
@@ -885,6 +911,7 @@ const CameraComponent = React.memo(({
       if (response.ok) {
         const results = await response.json();
         console.log('📊 Proctoring results:', results);
+        applySamplingRecommendation(results.sampling);
         
         if (results.suspiciousActivities && results.suspiciousActivities.length > 0) {
             const filteredAlerts = results.suspiciousActivities.filter(activity => {
@@ -927,7 +954,7 @@ const CameraComponent = React.memo(({
 
 
     
-  }, [requiresCamera, examId, onProctoringAlert, cameraState.isConnected, camOn, teacherDetectionSettings, socketRef, tabSwitchCount, windowBlurCount, microphoneActive, isSpeaking]);
+  }, [requiresCamera, examId, onProctoringAlert, cameraState.isConnected, camOn, teacherDetectionSettings, socketRef, tabSwitchCount, windowBlurCount, microphoneActive, isSpeaking, applySamplingRecommendation]);
   
   // Sa CameraComponent, dagdag ng useEffect:
 useEffect(() => {
@@ -954,14 +981,31 @@ useEffect(() => {
 
 
 =======
-  }, [requiresCamera, examId, onProctoringAlert, cameraState.isConnected, camOn, teacherDetectionSettings, socketRef, tabSwitchCount, windowBlurCount, microphoneActive, isSpeaking]);
+  }, [requiresCamera, examId, onProctoringAlert, cameraState.isConnected, camOn, teacherDetectionSettings, socketRef, tabSwitchCount, windowBlurCount, microphoneActive, isSpeaking, applySamplingRecommendation]);
   
 >>>>>>> backupRepo/main
+  // The capture timer always calls the latest captureFrame, so it can be rescheduled at any time
+  useEffect(() => {
+    captureFrameRef.current = captureFrame;
+  }, [captureFrame]);
+
+  // Server-pushed sampling recommendation for this student
+  useEffect(() => {
+    const socket = socketRef?.current;
+    if (!socket) return;
+
+    socket.on('sampling-recommendation', applySamplingRecommendation);
+    return () => {
+      socket.off('sampling-recommendation', applySamplingRecommendation);
+    };
+  }, [socketRef, cameraState.isConnected, applySamplingRecommendation]);
+
   const startProctoring = useCallback(() => {
     if (!requiresCamera || !cameraState.isConnected) return;
-    captureIntervalRef.current = setInterval(captureFrame, 3000);
-    console.log('📹 Proctoring started - capturing frames every 3 seconds');
-  }, [requiresCamera, captureFrame, cameraState.isConnected]);
+    const { intervalMs } = samplingRef.current;
+    captureIntervalRef.current = setInterval(() => captureFrameRef.current?.(), intervalMs);
+    console.log(`📹 Proctoring started - capturing frames every ${intervalMs / 1000} seconds`);
+  }, [requiresCamera, cameraState.isConnected]);
   
   const stopProctoring = useCallback(() => {
     if (captureIntervalRef.current) {
@@ -3111,16 +3155,18 @@ newSocket.on('clear-timer-cache', (data) => {
 >>>>>>> backupRepo/main
       
       if (data.settings) {
+        // Exam-wide broadcasts carry per-student overrides keyed by socket id
+        const settings = { ...data.settings, ...(data.overrides?.[newSocket.id] || {}) };
         setTeacherDetectionSettings(prev => ({
           ...prev,
-          ...data.settings
+          ...settings
         }));
         
-        if (data.settings.maxAttempts) {
+        if (settings.maxAttempts) {
           setStudentAttempts(prev => ({
             ...prev,
-            maxAttempts: data.settings.maxAttempts,
-            attemptsLeft: data.settings.maxAttempts - prev.currentAttempts
+            maxAttempts: settings.maxAttempts,
+            attemptsLeft: settings.maxAttempts - prev.currentAttempts
           }));
         }
       }
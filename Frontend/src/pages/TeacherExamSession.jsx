@@ -2,7 +2,7 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { io } from 'socket.io-client';
-import api, { startExamSession, endExamSession } from '../lib/api';
+import api, { startExamSession, endExamSession, endProctoringExam } from '../lib/api';
 import './TeacherExamSession.css';
 import TeacherProctoringControls from './TeacherProctoringControls';
 
@@ -572,6 +572,7 @@ const handleEndExamSession = async () => {
     
     if (response.data.success) {
       console.log("✅ Session ended successfully");
+      endProctoringExam(currentExamId).catch(error => console.warn('⚠️ Proctoring server not notified of exam end:', error));
       
       // ✅ Update exam state
       const endedAt = new Date();
@@ -802,6 +803,7 @@ const handleStartExam = async () => {
       
       if (response.data.success) {
         console.log('✅ Session ended successfully via API');
+        endProctoringExam(currentExamId).catch(error => console.warn('⚠️ Proctoring server not notified of exam end:', error));
         
         // Notify all students to disconnect
         if (socketRef.current) {
@@ -0,0 +1,70 @@
+"""Microbenchmark: per-event cost of violation/tab-switch history under a sustained alert storm
+
+Compares the old list append + re-slice pattern against the bounded deques
+used by StudentSession. Run with: python bench_alert_storm.py [events]
+"""
+import sys
+import time
+from datetime import datetime
+
+from proctoring_state import StudentSession, VIOLATION_HISTORY_SIZE, TAB_HISTORY_SIZE
+
+
+def make_event(i):
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'type': 'gaze_deviation',
+        'message': f'Eye movement detected #{i}',
+        'severity': 'medium',
+        'attempts_used': i * 0.5,
+        'attempts_left': 0,
+        'deducted': 0.5
+    }
+
+
+def bench_list_reslice(events):
+    history = {'violation_history': [], 'history': []}
+    start = time.perf_counter()
+    for event in events:
+        history['violation_history'].append(event)
+        if len(history['violation_history']) > VIOLATION_HISTORY_SIZE:
+            history['violation_history'] = history['violation_history'][-VIOLATION_HISTORY_SIZE:]
+        history['history'].append(event)
+        if len(history['history']) > TAB_HISTORY_SIZE:
+            history['history'] = history['history'][-TAB_HISTORY_SIZE:]
+    return time.perf_counter() - start
+
+
+def bench_session_deque(events):
+    session = StudentSession('bench-sid', 'bench-exam')
+    start = time.perf_counter()
+    for event in events:
+        session.violation_history.append(event)
+        session.tab_history.append(event)
+    return time.perf_counter() - start
+
+
+def bench_snapshot(rounds):
+    session = StudentSession('bench-sid', 'bench-exam')
+    for i in range(VIOLATION_HISTORY_SIZE):
+        session.violation_history.append(make_event(i))
+        session.tab_history.append(make_event(i))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        session.attempts_snapshot()
+        session.tab_switch_snapshot(last=10)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    events = [make_event(i) for i in range(n)]
+
+    old = bench_list_reslice(events)
+    new = bench_session_deque(events)
+    snap = bench_snapshot(n // 10)
+
+    print(f"Alert storm: {n} events (violation cap {VIOLATION_HISTORY_SIZE}, tab cap {TAB_HISTORY_SIZE})")
+    print(f"  list append + re-slice : {old / n * 1e9:8.1f} ns/event")
+    print(f"  bounded deque          : {new / n * 1e9:8.1f} ns/event  ({old / new:.1f}x faster)")
+    print(f"  snapshot export        : {snap / (n // 10) * 1e9:8.1f} ns/snapshot")
@@ -17,10 +17,12 @@ import tempfile
 import threading
 from collections import deque
 import time
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import pytesseract
 from PIL import Image
 import io
+import hashlib
 <<<<<<< HEAD
 
 import requests
@@ -31,14 +33,11 @@ import requests  # ✅ ADDED: For logging violations to backend
 import json     # ✅ ADDED: For JSON payload
 
 >>>>>>> backupRepo/main
-# Add near other global variables
-student_attempts = defaultdict(lambda: {
-    'current_attempts': 0,
-    'max_attempts': 10,
-    'attempts_left': 10,
-    'violation_history': [],
-    'last_violation_time': None
-})
+from proctoring_state import (
+    StudentSession, SignalSmoother, AttemptsEngine, ExamStatusAggregate, RegionResultCache, RateLimiter, default_severity_policy,
+    BucketedCounter, compile_detection_plan, DEFAULT_DETECTION_PLAN, AnalyzedFrame, StageOutput, SamplingPlan, score_screenshot_tools,
+    FLAG_FACE, FLAG_MULTIPLE_PEOPLE, FLAG_GAZE_AWAY, FLAG_HEAD_TURNED, FLAG_MOUTH_MOVING, FLAG_SUSPICIOUS
+)
 
 # Add this global variable to track mouse movement
 mouse_movement_tracker = defaultdict(lambda: {
@@ -48,15 +47,8 @@ mouse_movement_tracker = defaultdict(lambda: {
     'is_stationary_alert_sent': False
 })
 
-# Add near the top with other global variables
-tab_switch_tracker = defaultdict(lambda: {
-    'count': 0,
-    'last_switch_time': None,
-    'history': []
-})
-
 screenshot_detection_enabled = True
-screenshot_violations = defaultdict(list)
+screenshot_violations = defaultdict(lambda: deque(maxlen=50))  # Keep only recent violations per exam
 
 <<<<<<< HEAD
 
@@ -168,32 +160,196 @@ pose_detector = mp_pose.Pose(
     min_tracking_confidence=0.3
 )
 
-# Store connected clients and audio data
+# Store connected clients (sid -> StudentSession)
 connected_clients = {}
-audio_data_buffer = deque(maxlen=100)
-detection_history = deque(maxlen=50)  # Track detection history for better accuracy
+
+# Exam-scoped sessions keyed by "{exam_id}_{sid}"; they own attempts and tab switches
+DETECTION_HISTORY_SIZE = 50
+student_sessions = {}
+
+def get_student_session(exam_id, student_socket_id):
+    """Get (or create) the session holding a student's state for an exam"""
+    key = f"{exam_id}_{student_socket_id}"
+    session = student_sessions.get(key)
+    if session is None:
+        # Each exam gets its own session; the socket's session is never shared, since join_exam
+        # repoints it at whichever exam the student is in now
+        session = StudentSession(student_socket_id, exam_id, history_size=DETECTION_HISTORY_SIZE)
+        client = connected_clients.get(student_socket_id)
+        if client is not None:
+            session.apply_settings(client.settings, client.plan, client.settings_version)
+        student_sessions[key] = session
+    session.last_seen = time.time()
+    return session
+
+def find_student_session(exam_id, student_socket_id):
+    """Get a student's exam session without creating one"""
+    return student_sessions.get(f"{exam_id}_{student_socket_id}")
+
+def get_detection_plan(student_socket_id, session=None):
+    """Compiled detection plan for a student - the live socket's settings win over the exam session's"""
+    client = connected_clients.get(student_socket_id)
+    if client is not None:
+        return client.plan
+    return session.plan if session is not None else DEFAULT_DETECTION_PLAN
+
+# ==================== ATTEMPTS ENGINE ====================
+# Single place where attempts are deducted, for both socket alerts and /update_attempts.
+# Swap attempts_engine.severity_policy to change how much each violation type costs.
+attempts_engine = AttemptsEngine(stripes=64, severity_policy=default_severity_policy)
+
+# Teacher dashboard rows per exam, updated where attempts/tab switches/alerts/scores change
+exam_status = ExamStatusAggregate()
+ATTEMPTS_FLUSH_INTERVAL = float(os.environ.get('PROCTORING_ATTEMPTS_FLUSH_INTERVAL', 0.5))
+_attempts_notifier_started = False
+
+def notify_attempts_update(exam_id, student_socket_id, attempts, detection_type=None):
+    """Send attempts-update to a student, coalesced per flush interval when the notifier runs"""
+    payload = {
+        'attempts': attempts,
+        'studentSocketId': student_socket_id,
+        'examId': exam_id,
+        'detectionType': detection_type
+    }
+    exam_status.update(
+        exam_id, student_socket_id,
+        currentAttempts=attempts['current_attempts'],
+        maxAttempts=attempts['max_attempts'],
+        attemptsLeft=attempts['attempts_left']
+    )
+    if _attempts_notifier_started:
+        attempts_engine.queue_update(f"{exam_id}_{student_socket_id}", payload)
+    else:
+        sio.emit('attempts-update', payload, room=student_socket_id)
+
+def attempts_notifier():
+    """Background task that flushes the latest attempts-update per student"""
+    while True:
+        sio.sleep(ATTEMPTS_FLUSH_INTERVAL)
+        for payload in attempts_engine.drain_updates():
+            try:
+                sio.emit('attempts-update', payload, room=payload['studentSocketId'])
+            except Exception as e:
+                print(f"Attempts notifier error: {e}")
+
+def start_attempts_notifier():
+    """Start the batched attempts-update notifier once per process"""
+    global _attempts_notifier_started
+    if not _attempts_notifier_started:
+        _attempts_notifier_started = True
+        sio.start_background_task(attempts_notifier)
+
+# ==================== EXAM STATE EVICTION ====================
+# Disconnected sessions are kept for a while so teachers can still review them,
+# then optionally flushed to disk and dropped so memory stays flat over long uptimes.
+SESSION_IDLE_TTL = int(os.environ.get('PROCTORING_SESSION_IDLE_TTL', 6 * 3600))  # seconds without activity
+EXAM_RETENTION = int(os.environ.get('PROCTORING_EXAM_RETENTION', 30 * 60))  # seconds kept after an exam ends
+MAX_STUDENT_SESSIONS = int(os.environ.get('PROCTORING_MAX_SESSIONS', 20000))  # LRU cap
+SWEEP_INTERVAL = int(os.environ.get('PROCTORING_SWEEP_INTERVAL', 60))
+FLUSH_EVICTED_SESSIONS = os.environ.get('PROCTORING_FLUSH_EVICTED', '0') == '1'  # Opt-in archive of evicted sessions
+EVICTED_SESSIONS_FILE = os.environ.get('PROCTORING_EVICTED_FILE', 'evicted_sessions.json')
+
+exam_end_times = {}  # exam_id -> time the teacher ended the exam
+_sweeper_started = False
+
+def flush_session_to_disk(key, session):
+    """Append an evicted session's attempts and tab switches to the local archive file"""
+    try:
+        record = {
+            "key": key,
+            "exam_id": session.exam_id,
+            "student_socket_id": session.sid,
+            "attempts": session.attempts_snapshot(),
+            "tab_switches": {
+                "count": session.tab_switch_count,
+                "last_switch_time": session.last_switch_time,
+                "history": session.tab_switch_snapshot()
+            },
+            "evicted_at": datetime.now().isoformat()
+        }
+        with open(EVICTED_SESSIONS_FILE, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except Exception as e:
+        print(f"Session flush error: {e}")
+
+def evict_session(key):
+    """Drop one exam session and the per-key trackers that belong to it"""
+    session = student_sessions.pop(key, None)
+    mouse_movement_tracker.pop(key, None)
+    if session is not None:
+        exam_status.remove(session.exam_id, session.sid)
+    audio_streams.pop(key, None)
+    if session is not None and FLUSH_EVICTED_SESSIONS:
+        flush_session_to_disk(key, session)
+    return session
+
+def sweep_expired_state(now=None):
+    """Evict exam state past its TTL/retention, then trim to the LRU cap"""
+    now = time.time() if now is None else now
+    evicted = 0
+    idle = []
+
+    for key, session in list(student_sessions.items()):
+        client = connected_clients.get(session.sid)
+        if client is not None and str(client.exam_id) == str(session.exam_id):
+            continue  # Never evict the session of an exam a live socket is in
+        ended_at = exam_end_times.get(session.exam_id)
+        if (ended_at is not None and now - ended_at >= EXAM_RETENTION) or now - session.last_seen >= SESSION_IDLE_TTL:
+            evict_session(key)
+            evicted += 1
+        else:
+            idle.append((session.last_seen, key))
+
+    # LRU: least recently used disconnected sessions go first
+    overflow = len(student_sessions) - MAX_STUDENT_SESSIONS
+    if overflow > 0:
+        idle.sort()
+        for _, key in idle[:overflow]:
+            evict_session(key)
+            evicted += 1
+
+    for exam_id, entries in list(screenshot_violations.items()):
+        ended_at = exam_end_times.get(exam_id)
+        try:
+            last_at = datetime.fromisoformat(entries[-1]['timestamp']).timestamp() if entries else 0
+        except (KeyError, ValueError):
+            last_at = 0
+        if (ended_at is not None and now - ended_at >= EXAM_RETENTION) or now - last_at >= SESSION_IDLE_TTL:
+            del screenshot_violations[exam_id]
+
+    for exam_id, ended_at in list(exam_end_times.items()):
+        if now - ended_at >= EXAM_RETENTION:
+            del exam_end_times[exam_id]
+            exam_audio_formats.pop(exam_id, None)
+            exam_settings.pop(exam_id, None)
+            exam_status.discard(exam_id)
+            ocr_rate_limiter.discard(exam_id)
+            exam_sampling_scale.pop(exam_id, None)
+
+    if evicted:
+        print(f"🧹 Evicted {evicted} expired student sessions ({len(student_sessions)} remaining)")
+    return evicted
+
+def session_sweeper():
+    """Background task that periodically evicts expired exam state"""
+    while True:
+        sio.sleep(SWEEP_INTERVAL)
+        try:
+            sweep_expired_state()
+        except Exception as e:
+            print(f"Session sweeper error: {e}")
+
+def start_session_sweeper():
+    """Start the eviction sweeper once per process"""
+    global _sweeper_started
+    if not _sweeper_started:
+        _sweeper_started = True
+        sio.start_background_task(session_sweeper)
 
 @sio.event
 def connect(sid, environ):
     print(f"✅ Client connected: {sid}")
-    connected_clients[sid] = {
-        'connected_at': datetime.now(),
-        'user_role': None,
-        'exam_id': None,
-        'audio_alerts': 0,
-        'screenshot_alerts': 0,
-        'last_audio_alert': None,
-        'last_screenshot_alert': None,
-        'detection_stats': {
-            'face_detected_count': 0,
-            'total_frames': 0,
-            'recent_gaze': [],
-            'recent_head_pose': [],
-            'screenshot_attempts': 0,
-            'tab_switches': 0
-        },
-        'detection_settings': {}
-    }
+    connected_clients[sid] = StudentSession(sid, history_size=DETECTION_HISTORY_SIZE)
 
 @sio.event
 def manual_violation(sid, data):
@@ -235,16 +391,44 @@ def join_exam(sid, data):
     user_role = data.get('userRole')
     
     if exam_id and user_role:
-        connected_clients[sid]['exam_id'] = exam_id
-        connected_clients[sid]['user_role'] = user_role
+        session = connected_clients[sid]
+        session.exam_id = exam_id
+        session.user_role = user_role
         sio.enter_room(sid, f"exam-{exam_id}")
+        apply_exam_settings(exam_id, session)
         print(f"🎓 Student {sid} joined exam {exam_id}")
 
+def mark_exam_ended(exam_id):
+    """Start an exam's retention clock; its state is evicted once the retention period passes"""
+    exam_end_times[exam_id] = time.time()
+    print(f"🏁 Exam {exam_id} ended - state retained for {EXAM_RETENTION}s")
+    return {"status": "exam_ended", "retentionSeconds": EXAM_RETENTION}
+
+@sio.event
+def end_exam(sid, data):
+    """Teacher ends an exam over the proctoring socket"""
+    exam_id = data.get('examId')
+    if not exam_id:
+        return {"error": "Missing examId"}
+    return mark_exam_ended(exam_id)
+
+@app.route('/end-exam', methods=['POST'])
+def end_exam_http():
+    """Teacher ends an exam (called from the teacher's end-session flow)"""
+    data = request.json or {}
+    exam_id = data.get('exam_id')
+    if not exam_id:
+        return jsonify({"error": "Missing exam_id"}), 400
+    return jsonify(mark_exam_ended(exam_id))
+
 @sio.event
 def disconnect(sid):
     print(f"❌ Client disconnected: {sid}")
-    if sid in connected_clients:
-        del connected_clients[sid]
+    client = connected_clients.pop(sid, None)
+    session = find_student_session(client.exam_id, sid) if client is not None else None
+    if session is not None:
+        # Attempts and tab switches stay in student_sessions; per-frame buffers are no longer needed
+        session.free_frame_state()
 
 @sio.event
 def tab_switch_detected(sid, data):
@@ -258,30 +442,26 @@ def tab_switch_detected(sid, data):
         count = data.get('count', 1)
         
         # ✅ CHECK IF TAB SWITCH DETECTION IS ENABLED FOR THIS STUDENT
-        client_info = connected_clients.get(student_socket_id, {})
-        
-        # Get detection settings from client (if available)
-        detection_settings = client_info.get('detection_settings', {})
-        
         # If tab switch detection is explicitly disabled, ignore it
-        if detection_settings.get('tabSwitchDetection') is False:
+        if not get_detection_plan(student_socket_id).tab_switch:
             print(f"🛑 Tab switch detection disabled for student {student_socket_id} - ignoring")
             return {"status": "ignored", "reason": "tab_switch_detection_disabled"}
         
         # Update tracking
         if exam_id and student_socket_id:
-            key = f"{exam_id}_{student_socket_id}"
-            tab_switch_tracker[key]['count'] = count
-            tab_switch_tracker[key]['last_switch_time'] = timestamp
-            tab_switch_tracker[key]['history'].append({
+            session = get_student_session(exam_id, student_socket_id)
+            session.tab_switch_count = count
+            session.last_switch_time = timestamp
+            exam_status.update(exam_id, student_socket_id, tabSwitches=count)
+            now = time.time()
+            session.record_tab_switch(now)
+            # Bounded deque - oldest entries drop off in O(1)
+            session.tab_history.append({
                 'timestamp': timestamp,
+                'epoch': now,
                 'count': count,
                 'student_socket_id': student_socket_id
             })
-            
-            # Keep only recent history
-            if len(tab_switch_tracker[key]['history']) > 20:
-                tab_switch_tracker[key]['history'] = tab_switch_tracker[key]['history'][-20:]
         
         # ✅ IMPORTANTE: GUMAMIT NG send_proctoring_alert PARA MA-UPDATE ANG ATTEMPTS
         if exam_id and student_socket_id:
@@ -311,7 +491,7 @@ def update_detection_settings(sid, data):
         settings = data.get('settings', {})
         
         if student_socket_id in connected_clients:
-            connected_clients[student_socket_id]['detection_settings'] = settings
+            connected_clients[student_socket_id].apply_settings(settings)
             print(f"🎯 Updated detection settings for student {student_socket_id}: {settings}")
             
             # Forward the settings to the student
@@ -328,6 +508,73 @@ def update_detection_settings(sid, data):
         print(f"Update detection settings error: {e}")
         return {"error": str(e)}
 
+# ==================== EXAM-WIDE SETTINGS ====================
+# One versioned settings document per exam, with optional per-student overrides. Each distinct
+# effective settings dict is compiled to a plan once per version and shared by every session.
+exam_settings = {}  # exam_id -> {'version', 'settings', 'overrides', 'compiled'}
+
+def apply_exam_settings(exam_id, session):
+    """Apply an exam's current settings document (plus the student's override) to one session"""
+    document = exam_settings.get(exam_id)
+    if document is None or session.user_role == 'teacher':
+        return False
+    override = document['overrides'].get(session.sid)
+    key = session.sid if override else None
+    compiled = document['compiled'].get(key)
+    if compiled is None:
+        settings = {**document['settings'], **override} if override else document['settings']
+        compiled = document['compiled'][key] = (settings, compile_detection_plan(settings))
+    session.apply_settings(compiled[0], compiled[1], document['version'])
+    return True
+
+@sio.event
+def update_exam_detection_settings(sid, data):
+    """Teacher updates detection settings for every student in an exam in one call"""
+    try:
+        exam_id = data.get('examId')
+        if not exam_id:
+            return {"error": "Missing examId"}
+        
+        current = exam_settings.get(exam_id)
+        version = data.get('version')
+        if version is not None:
+            try:
+                version = int(version)
+            except (TypeError, ValueError):
+                return {"error": "Invalid settings version"}
+        if version is None:
+            version = current['version'] + 1 if current else 1
+        elif current and version <= current['version']:
+            return {"error": "Stale settings version", "version": current['version']}
+        
+        exam_settings[exam_id] = {
+            'version': version,
+            'settings': data.get('settings', {}),
+            'overrides': data.get('overrides') or {},  # studentSocketId -> partial settings
+            'compiled': {}  # None (base) or studentSocketId -> (effective settings, plan)
+        }
+        
+        applied = 0
+        for session in list(connected_clients.values()):
+            if session.exam_id == exam_id and apply_exam_settings(exam_id, session):
+                applied += 1
+        
+        # One broadcast for the whole room; students apply overrides[their socket id] on top
+        sio.emit('detection-settings-update', {
+            'examId': exam_id,
+            'version': version,
+            'settings': exam_settings[exam_id]['settings'],
+            'overrides': exam_settings[exam_id]['overrides'],
+            'customMessage': data.get('customMessage', '')
+        }, room=f"exam-{exam_id}")
+        
+        print(f"🎯 Exam {exam_id} detection settings v{version} applied to {applied} students")
+        return {"status": "settings_updated", "version": version, "applied": applied}
+        
+    except Exception as e:
+        print(f"Update exam detection settings error: {e}")
+        return {"error": str(e)}
+
 @sio.event
 def update_student_attempts(sid, data):
     """Update student attempts from teacher"""
@@ -337,23 +584,12 @@ def update_student_attempts(sid, data):
         exam_id = data.get('examId')
         
         if student_socket_id and exam_id:
-            key = f"{exam_id}_{student_socket_id}"
-            
             # Store attempts data
-            student_attempts[key] = {
-                'current_attempts': attempts_data.get('currentAttempts', 0),
-                'max_attempts': attempts_data.get('maxAttempts', 10),
-                'attempts_left': attempts_data.get('attemptsLeft', 10),
-                'violation_history': attempts_data.get('history', []),
-                'last_updated': datetime.now().isoformat()
-            }
+            session = get_student_session(exam_id, student_socket_id)
+            attempts = attempts_engine.load(f"{exam_id}_{student_socket_id}", session, attempts_data)
             
             # Send to student if connected
-            sio.emit('attempts-update', {
-                'attempts': student_attempts[key],
-                'studentSocketId': student_socket_id,
-                'examId': exam_id
-            }, room=student_socket_id)
+            notify_attempts_update(exam_id, student_socket_id, attempts)
             
             return {"status": "attempts_updated"}
             
@@ -369,20 +605,50 @@ def get_student_attempts(sid, data):
         exam_id = data.get('examId')
         
         if student_socket_id and exam_id:
-            key = f"{exam_id}_{student_socket_id}"
-            attempts = student_attempts.get(key, {
-                'current_attempts': 0,
-                'max_attempts': 10,
-                'attempts_left': 10,
-                'violation_history': []
-            })
+            session = find_student_session(exam_id, student_socket_id)
+            if session is None:
+                return {"attempts": StudentSession(student_socket_id, exam_id).attempts_snapshot()}
             
-            return {"attempts": attempts}
+            return {"attempts": attempts_engine.query(f"{exam_id}_{student_socket_id}", session)}
             
     except Exception as e:
         print(f"Get student attempts error: {e}")
         return {"error": str(e)}
 
+@sio.event
+def get_exam_status(sid, data):
+    """Dashboard snapshot for a whole exam; pass `since` (a previous version) for only what changed"""
+    exam_id = data.get('examId')
+    if not exam_id:
+        return {"error": "Missing examId"}
+    since = data.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except (TypeError, ValueError):
+            return {"error": "Invalid since version"}
+    return exam_status.snapshot(exam_id, since)
+
+@sio.event
+def reset_student_attempts(sid, data):
+    """Teacher restores a student's attempts"""
+    try:
+        student_socket_id = data.get('studentSocketId')
+        exam_id = data.get('examId')
+        
+        if not student_socket_id or not exam_id:
+            return {"error": "Missing studentSocketId or examId"}
+        
+        session = get_student_session(exam_id, student_socket_id)
+        attempts = attempts_engine.reset(f"{exam_id}_{student_socket_id}", session, data.get('maxAttempts'))
+        notify_attempts_update(exam_id, student_socket_id, attempts)
+        
+        return {"status": "attempts_reset", "attempts": attempts}
+        
+    except Exception as e:
+        print(f"Reset student attempts error: {e}")
+        return {"error": str(e)}
+
 @sio.event
 def store_detection_settings(sid, data):
     """Store detection settings from student"""
@@ -391,7 +657,7 @@ def store_detection_settings(sid, data):
         exam_id = data.get('examId')
         
         if sid in connected_clients:
-            connected_clients[sid]['detection_settings'] = settings
+            connected_clients[sid].apply_settings(settings)
             print(f"💾 Stored detection settings for student {sid}: {settings}")
             return {"status": "settings_stored"}
         else:
@@ -428,76 +694,38 @@ def send_proctoring_alert(exam_id, alert_data):
         print(f"🚨 [DEBUG] Processing for student {student_socket_id}")
         
         if student_socket_id:
-            # Get current attempts
-            key = f"{exam_id}_{student_socket_id}"
-            attempts = student_attempts.get(key, {
-                'current_attempts': 0,
-                'max_attempts': 10,
-                'attempts_left': 10,
-                'violation_history': []
-            })
-            
-            # ✅ DEDUCT ATTEMPTS FOR ALL VIOLATION TYPES
-            should_deduct = True  # Always deduct for any violation
-
-            # Get detection type    
+            # ✅ DEDUCT ATTEMPTS FOR ALL VIOLATION TYPES (amount comes from the engine's severity policy)
             detection_type = alert_data.get('detectionType', 'unknown')
-
-            # Determine severity level
-            major_violations = [
-                'tab_switching',
-                'multiple_people', 
-                'no_face_detected', 
-                'multiple_screen_indicators',
-                'speaking_detected',
-                'loud_noise_detected',
-                'low_attention_score'
-            ]
-
-            minor_violations = [
-                'gaze_deviation', 'head_pose_deviation', 'mouth_movement',
-                'mouse_usage', 'suspicious_gesture', 'audio_detection'
-            ]
-
-            if detection_type in major_violations:
-                severity_multiplier = 1.0  # Full attempt for major violations
-            elif detection_type in minor_violations:
-                severity_multiplier = 0.5  # Half attempt for minor violations
-            else:
-                severity_multiplier = 0.5  # Default to half attempt
+            session = get_student_session(exam_id, student_socket_id)
+            
+            attempts = attempts_engine.deduct(
+                f"{exam_id}_{student_socket_id}", session, detection_type,
+                message=alert_data.get('message', ''),
+                severity=alert_data.get('severity', 'medium'),
+                alert_data=alert_data
+            )
+            
+            exam_status.update(exam_id, student_socket_id, lastAlert={
+                'type': detection_type,
+                'message': alert_data.get('message', ''),
+                'timestamp': alert_data.get('timestamp')
+            })
             
-            if should_deduct:
-                attempts['current_attempts'] += severity_multiplier
-                attempts['attempts_left'] = max(0, attempts['max_attempts'] - attempts['current_attempts'])
-                
-                # Add to violation history
-                attempts['violation_history'].append({
-                    'timestamp': datetime.now().isoformat(),
-                    'type': detection_type,
-                    'message': alert_data.get('message', ''),
-                    'severity': alert_data.get('severity', 'medium'),
-                    'attempts_used': attempts['current_attempts'],
-                    'attempts_left': attempts['attempts_left'],
-                    'deducted': severity_multiplier
-                })
-                
-                # Keep only last 50 violations
-                if len(attempts['violation_history']) > 50:
-                    attempts['violation_history'] = attempts['violation_history'][-50:]
-                
-                student_attempts[key] = attempts
-                
-                # Add attempts info to alert
-                alert_data['attemptsInfo'] = {
-                    'currentAttempts': attempts['current_attempts'],
-                    'maxAttempts': attempts['max_attempts'],
-                    'attemptsLeft': attempts['attempts_left'],
-                    'violationCount': len(attempts['violation_history']),
-                    'deductedThisTime': severity_multiplier
-                }
+            # Add attempts info to alert
+            alert_data['attemptsInfo'] = {
+                'currentAttempts': attempts['current_attempts'],
+                'maxAttempts': attempts['max_attempts'],
+                'attemptsLeft': attempts['attempts_left'],
+                'violationCount': attempts['violation_count'],
+                'deductedThisTime': attempts['deducted']
+            }
+            notify_attempts_update(
+                exam_id, student_socket_id,
+                attempts_engine.query(f"{exam_id}_{student_socket_id}", session), detection_type
+            )
             
             # Check if attempts exhausted
-            if attempts['attempts_left'] <= 0:
+            if attempts['exhausted']:
                 # Send disconnect command to student
                 disconnect_reason = f"Attempts exhausted ({attempts['current_attempts']:.1f}/{attempts['max_attempts']} violations)"
                 
@@ -520,7 +748,7 @@ def send_proctoring_alert(exam_id, alert_data):
     except Exception as e:
         print(f"Error sending proctoring alert: {e}")
 
-def decode_image(image_base64):
+def decode_image(image_base64, enhance=True):
     """Decode base64 → OpenCV image with enhanced error handling"""
     try:
         image_data = image_base64.split(',')[1] if "," in image_base64 else image_base64
@@ -533,8 +761,7 @@ def decode_image(image_base64):
             return None
             
         # Enhance image quality for better detection
-        img = enhance_image_quality(img)
-        return img
+        return enhance_image_quality(img) if enhance else img
         
     except Exception as e:
         print(f"❌ Image decode error: {e}")
@@ -565,31 +792,47 @@ def enhance_image_quality(img):
         print(f"Image enhancement error: {e}")
         return img
 
-def get_gaze_direction_enhanced(face_landmarks, w, h):
-    """ENHANCED gaze detection with better accuracy"""
+# ==================== LANDMARK FEATURE EXTRACTION ====================
+# MediaPipe landmarks are converted to NumPy arrays once per frame; detectors then
+# index these precomputed tables instead of reading protobuf attributes one by one.
+GAZE_IDX = np.array([33, 133, 362, 263, 468, 473, 159, 145, 386, 374])  # eye corners, pupils, lids
+MOUTH_IDX = np.array([13, 14, 61, 291, 0, 17])  # lips, corners, outer lip centers
+HEAD_POSE_IDX = np.array([1, 152, 33, 263, 61, 291])  # nose tip, chin, outer eye corners, mouth corners
+MOUTH_THRESHOLDS = np.array([0.035, 0.025, 0.18, 0.02])  # vertical, center, width, corner movement
+
+HAND_WRIST, HAND_THUMB_TIP, HAND_INDEX_TIP, HAND_PALM, HAND_MIDDLE_TIP, HAND_PINKY_TIP = 0, 4, 8, 9, 12, 20
+FINGER_TIPS_IDX = np.array([4, 8, 12, 16, 20])  # thumb, index, middle, ring, pinky
+
+def landmarks_to_array(landmark_list):
+    """Convert one MediaPipe landmark list into an (N, 3) float32 array of x, y, z"""
+    points = landmark_list.landmark
+    return np.fromiter(
+        (coord for point in points for coord in (point.x, point.y, point.z)),
+        dtype=np.float32, count=len(points) * 3
+    ).reshape(-1, 3)
+
+def stack_landmarks(landmark_lists, num_points):
+    """Stack several landmark lists (faces or hands) into an (M, num_points, 3) array"""
+    if not landmark_lists:
+        return np.empty((0, num_points, 3), dtype=np.float32)
+    return np.stack([landmarks_to_array(landmarks) for landmarks in landmark_lists])
+
+def pose_to_array(pose_results):
+    """Pose landmarks as a (33, 4) array of x, y, z, visibility, or None"""
+    if pose_results is None or not pose_results.pose_landmarks:
+        return None
+    points = pose_results.pose_landmarks.landmark
+    return np.array([(p.x, p.y, p.z, p.visibility) for p in points], dtype=np.float32)
+
+def get_gaze_direction_enhanced(face_points, w, h):
+    """ENHANCED gaze detection with better accuracy (face_points: (478, 3) landmark array)"""
     try:
-        # Multiple eye landmarks for precise gaze tracking
-        left_eye_left = face_landmarks.landmark[33]    # Left eye left corner
-        left_eye_right = face_landmarks.landmark[133]  # Left eye right corner
-        right_eye_left = face_landmarks.landmark[362]  # Right eye left corner
-        right_eye_right = face_landmarks.landmark[263] # Right eye right corner
-        
-        left_pupil = face_landmarks.landmark[468]  # Left eye center
-        right_pupil = face_landmarks.landmark[473] # Right eye center
-        
-        # Calculate eye centers with pupil consideration
-        left_eye_center_x = (left_eye_left.x + left_eye_right.x) / 2
-        right_eye_center_x = (right_eye_left.x + right_eye_right.x) / 2
-        eye_center_x = (left_eye_center_x + right_eye_center_x) / 2
+        eye = face_points[GAZE_IDX]
+        x, y = eye[:, 0], eye[:, 1]
         
-        # Calculate pupil positions relative to eye centers
-        left_pupil_offset = left_pupil.x - left_eye_center_x
-        right_pupil_offset = right_pupil.x - right_eye_center_x
-        avg_pupil_offset = (left_pupil_offset + right_pupil_offset) / 2
-        
-        # Reference points
-        nose_tip = face_landmarks.landmark[1]
-        nose_bridge = face_landmarks.landmark[168]
+        # Eye centers (left, right) and pupil offsets relative to them
+        eye_centers_x = (x[[0, 2]] + x[[1, 3]]) / 2
+        avg_pupil_offset = float(np.mean(x[[4, 5]] - eye_centers_x))
         
         # ENHANCED Horizontal gaze detection with pupil tracking
         horizontal_gaze = "center"
@@ -598,20 +841,12 @@ def get_gaze_direction_enhanced(face_landmarks, w, h):
         elif avg_pupil_offset > 0.02:
             horizontal_gaze = "right"
         
-        # ENHANCED Vertical gaze detection
-        left_eye_upper = face_landmarks.landmark[159]
-        left_eye_lower = face_landmarks.landmark[145]
-        right_eye_upper = face_landmarks.landmark[386]
-        right_eye_lower = face_landmarks.landmark[374]
-        
-        left_eye_openness = abs(left_eye_upper.y - left_eye_lower.y)
-        right_eye_openness = abs(right_eye_upper.y - right_eye_lower.y)
+        # ENHANCED Vertical gaze detection based on pupil position between the lids
+        left_eye_openness, right_eye_openness = np.abs(y[[6, 8]] - y[[7, 9]])
+        avg_pupil_y = y[[4, 5]].mean()
+        eye_center_y = y[6:10].mean()
         
-        # Calculate vertical gaze based on pupil position
         vertical_gaze = "center"
-        avg_pupil_y = (left_pupil.y + right_pupil.y) / 2
-        eye_center_y = (left_eye_upper.y + left_eye_lower.y + right_eye_upper.y + right_eye_lower.y) / 4
-        
         if avg_pupil_y < eye_center_y - 0.01:
             vertical_gaze = "up"
         elif avg_pupil_y > eye_center_y + 0.01:
@@ -628,8 +863,8 @@ def get_gaze_direction_enhanced(face_landmarks, w, h):
             gaze = f"looking {horizontal_gaze} and {vertical_gaze}"
         
         # Enhanced eye openness detection
-        eyes_open = (left_eye_openness > 0.015 and right_eye_openness > 0.015)  # More sensitive
-        is_blinking = (left_eye_openness < 0.02 or right_eye_openness < 0.02)  # More sensitive
+        eyes_open = bool(left_eye_openness > 0.015 and right_eye_openness > 0.015)  # More sensitive
+        is_blinking = bool(left_eye_openness < 0.02 or right_eye_openness < 0.02)  # More sensitive
         
         return gaze, eyes_open, is_blinking, avg_pupil_offset
         
@@ -640,33 +875,73 @@ def get_gaze_direction_enhanced(face_landmarks, w, h):
 # ILAGAY AFTER NG get_gaze_direction_enhanced() at BEFORE ng socket events
 
 # ==================== SCREENSHOT DETECTION FUNCTIONS ====================
+# The screenshot detectors share one ScreenshotContext: grayscale, edges, contours (with areas in
+# full-resolution pixels) and color masks are computed once, at most SCREENSHOT_ANALYSIS_WIDTH wide.
+SCREENSHOT_ANALYSIS_WIDTH = int(os.environ.get('SCREENSHOT_ANALYSIS_WIDTH', 640))
+
+ScreenshotContext = namedtuple('ScreenshotContext', [
+    'image', 'gray', 'edge_contours', 'edge_areas', 'bright_contours', 'bright_areas',
+    'color_masks', 'scale', 'total_pixels'
+])
+
+# Tool overlay colors as BGR inRange bounds (blue, orange, green)
+SCREENSHOT_TOOL_COLORS = (
+    ("blue_tool_overlay", (200, 100, 100), (255, 150, 150)),
+    ("orange_tool_overlay", (0, 100, 200), (50, 150, 255)),
+    ("green_tool_overlay", (0, 150, 0), (100, 255, 100))
+)
+
+def contour_areas(contours, scale):
+    """Contour areas converted back to full-resolution pixels"""
+    return np.array([cv2.contourArea(contour) for contour in contours], dtype=np.float64) / (scale * scale)
+
+def build_screenshot_context(image):
+    """Shared grayscale/edge/contour/mask pass for the screenshot detectors"""
+    h, w = image.shape[:2]
+    scale = min(1.0, SCREENSHOT_ANALYSIS_WIDTH / w)
+    small = cv2.resize(image, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+    
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(gray, 50, 150)
+    edge_contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
+    bright_contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    color_masks = [(name, cv2.inRange(small, low, high)) for name, low, high in SCREENSHOT_TOOL_COLORS]
+    
+    return ScreenshotContext(
+        small, gray,
+        edge_contours, contour_areas(edge_contours, scale),
+        bright_contours, contour_areas(bright_contours, scale),
+        color_masks, scale, gray.shape[0] * gray.shape[1]
+    )
 
 def detect_screenshot_activity(image, exam_id, student_id):
     """Detect potential screenshot activity using multiple methods"""
     try:
         violations = []
         confidence = 0.0
+        context = build_screenshot_context(image)
         
         # Method 1: Detect screenshot tools/windows in the image
-        screenshot_detected, screenshot_confidence = detect_screenshot_tools(image)
+        screenshot_detected, screenshot_confidence = detect_screenshot_tools(image, context)
         if screenshot_detected:
             violations.append("screenshot_tool_detected")
             confidence = max(confidence, screenshot_confidence)
         
         # Method 2: Detect screen capture artifacts
-        capture_artifacts, artifacts_confidence = detect_capture_artifacts(image)
+        capture_artifacts, artifacts_confidence = detect_capture_artifacts(image, context)
         if capture_artifacts:
             violations.append("screen_capture_artifacts")
             confidence = max(confidence, artifacts_confidence)
         
         # Method 3: Detect multiple monitors/windows
-        multi_screen, multi_confidence = detect_multiple_screens(image)
+        multi_screen, multi_confidence = detect_multiple_screens(image, context)
         if multi_screen:
             violations.append("multiple_screen_indicators")
             confidence = max(confidence, multi_confidence)
         
         # Method 4: Text analysis for screenshot-related content
-        screenshot_text, text_confidence = analyze_screenshot_text(image)
+        screenshot_text, text_confidence = analyze_screenshot_text(image, context, exam_id)
         if screenshot_text:
             violations.append("screenshot_related_text")
             confidence = max(confidence, text_confidence)
@@ -683,13 +958,7 @@ def detect_screenshot_activity(image, exam_id, student_id):
             }
             
             # Store in global tracking
-            if exam_id not in screenshot_violations:
-                screenshot_violations[exam_id] = []
             screenshot_violations[exam_id].append(violation_data)
-            
-            # Keep only recent violations
-            if len(screenshot_violations[exam_id]) > 50:
-                screenshot_violations[exam_id] = screenshot_violations[exam_id][-50:]
         
         return violations, confidence
         
@@ -697,83 +966,43 @@ def detect_screenshot_activity(image, exam_id, student_id):
         print(f"Screenshot detection error: {e}")
         return [], 0.0
 
-def detect_screenshot_tools(image):
+def screenshot_tool_evidence(context):
+    """Full-resolution overlay-color pixel counts and rectangular selection-box count of one context"""
+    # 1. Significant colored areas (potential tool overlays)
+    color_pixels = {name: cv2.countNonZero(mask) / (context.scale * context.scale) for name, mask in context.color_masks}
+    
+    # 2. Rectangular selection areas (common in screenshot tools)
+    selection_boxes = 0
+    for i in np.flatnonzero(context.edge_areas > 1000):
+        contour = context.edge_contours[i]
+        epsilon = 0.02 * cv2.arcLength(contour, True)
+        if len(cv2.approxPolyDP(contour, epsilon, True)) == 4:
+            selection_boxes += 1
+    
+    return color_pixels, selection_boxes
+
+def detect_screenshot_tools(image, context=None):
     """Detect screenshot tools and windows in the image"""
     try:
-        # Convert to RGB for better processing
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        h, w = rgb_image.shape[:2]
-        
-        # Look for common screenshot tool indicators
-        tool_indicators = []
+        if context is None:
+            context = build_screenshot_context(image)
         
-        # 1. Detect color patterns of common screenshot tools
-        blue_mask = cv2.inRange(rgb_image, (100, 100, 200), (150, 150, 255))
-        orange_mask = cv2.inRange(rgb_image, (200, 100, 0), (255, 150, 50))
-        green_mask = cv2.inRange(rgb_image, (0, 150, 0), (100, 255, 100))
-        
-        blue_pixels = cv2.countNonZero(blue_mask)
-        orange_pixels = cv2.countNonZero(orange_mask)
-        green_pixels = cv2.countNonZero(green_mask)
-        
-        total_pixels = h * w
-        
-        # Check for significant colored areas (potential tool overlays)
-        if blue_pixels / total_pixels > 0.01:
-            tool_indicators.append(("blue_tool_overlay", blue_pixels / total_pixels))
-        if orange_pixels / total_pixels > 0.01:
-            tool_indicators.append(("orange_tool_overlay", orange_pixels / total_pixels))
-        if green_pixels / total_pixels > 0.01:
-            tool_indicators.append(("green_tool_overlay", green_pixels / total_pixels))
-        
-        # 2. Detect rectangular selection areas (common in screenshot tools)
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(gray, 50, 150)
-        
-        # Find contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        selection_boxes = 0
-        for contour in contours:
-            epsilon = 0.02 * cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, epsilon, True)
-            
-            if len(approx) == 4:
-                area = cv2.contourArea(contour)
-                if area > 1000:
-                    selection_boxes += 1
-        
-        if selection_boxes > 0:
-            tool_indicators.append(("selection_boxes", min(1.0, selection_boxes * 0.3)))
-        
-        # Calculate overall confidence
-        if tool_indicators:
-            total_confidence = sum(conf for _, conf in tool_indicators)
-            avg_confidence = total_confidence / len(tool_indicators)
-            return True, min(avg_confidence, 1.0)
-        
-        return False, 0.0
+        color_pixels, selection_boxes = screenshot_tool_evidence(context)
+        return score_screenshot_tools(color_pixels, selection_boxes, context.total_pixels / (context.scale * context.scale))
         
     except Exception as e:
         print(f"Screenshot tools detection error: {e}")
         return False, 0.0
 
-def detect_capture_artifacts(image):
+def detect_capture_artifacts(image, context=None):
     """Detect screen capture artifacts"""
     try:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Edge detection for rectangular patterns (common in screen capture)
-        edges = cv2.Canny(gray, 50, 150)
-        
-        # Find contours that could be capture artifacts
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if context is None:
+            context = build_screenshot_context(image)
         
-        artifact_count = 0
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if 500 < area < 50000:
-                artifact_count += 1
+        # Edge contours of rectangular patterns that could be capture artifacts
+        areas = context.edge_areas
+        artifact_count = int(np.count_nonzero((areas > 500) & (areas < 50000)))
         
         # If many potential artifacts found
         if artifact_count > 3:
@@ -785,23 +1014,15 @@ def detect_capture_artifacts(image):
         print(f"Capture artifacts detection error: {e}")
         return False, 0.0
 
-def detect_multiple_screens(image):
+def detect_multiple_screens(image, context=None):
     """Detect multiple monitors or windows"""
     try:
+        if context is None:
+            context = build_screenshot_context(image)
         h, w = image.shape[:2]
         
-        # Look for multiple distinct screen areas
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
-        
-        # Count distinct bright areas (potential screens)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        screen_candidates = 0
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area > w * h * 0.1:  # At least 10% of image area
-                screen_candidates += 1
+        # Count distinct bright areas (potential screens) of at least 10% of the image area
+        screen_candidates = int(np.count_nonzero(context.bright_areas > w * h * 0.1))
         
         if screen_candidates > 1:
             return True, min(0.8, screen_candidates * 0.3)
@@ -812,22 +1033,75 @@ def detect_multiple_screens(image):
         print(f"Multiple screens detection error: {e}")
         return False, 0.0
 
-def analyze_screenshot_text(image):
+# OCR runs only on candidate regions (large bright areas - likely screens), on its own bounded
+# pool. Results are cached by each region's size and pixel digest so identical screen content is never
+# OCR'd twice, and every exam gets an OCR budget so one busy exam cannot starve the others.
+SCREENSHOT_KEYWORDS = (
+    'screenshot', 'capture', 'snip', 'print screen', 'prtsc',
+    'snapshot', 'screen grab', 'recording', 'save as'
+)
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 2))
+OCR_TIMEOUT = float(os.environ.get('OCR_TIMEOUT', 5))
+OCR_MAX_REGIONS = 4
+OCR_MIN_REGION_FRACTION = 0.02  # Candidate regions cover at least 2% of the frame
+ocr_executor = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix='ocr')
+ocr_cache = RegionResultCache(int(os.environ.get('OCR_CACHE_SIZE', 512)))
+ocr_rate_limiter = RateLimiter(
+    rate=float(os.environ.get('OCR_REGIONS_PER_MINUTE_PER_EXAM', 30)) / 60.0,
+    burst=float(os.environ.get('OCR_BURST_PER_EXAM', 10))
+)
+
+def region_hash(gray_region):
+    """Cache key of a grayscale region: its size plus a digest of its exact pixels"""
+    # Content-exact on purpose - a coarse perceptual hash cannot tell one line of text from another
+    h, w = gray_region.shape[:2]
+    return (w, h, hashlib.blake2b(gray_region.tobytes(), digest_size=16).digest())
+
+def ocr_candidate_regions(context, shape):
+    """Full-resolution (x, y, w, h) boxes of the largest bright areas, or the whole frame if there are none"""
+    h, w = shape[:2]
+    candidates = np.flatnonzero(context.bright_areas >= w * h * OCR_MIN_REGION_FRACTION)
+    if len(candidates) == 0:
+        return [(0, 0, w, h)]
+    largest = candidates[np.argsort(context.bright_areas[candidates])[::-1][:OCR_MAX_REGIONS]]
+    regions = []
+    for i in largest:
+        x, y, bw, bh = cv2.boundingRect(context.bright_contours[i])
+        regions.append((int(x / context.scale), int(y / context.scale), int(np.ceil(bw / context.scale)), int(np.ceil(bh / context.scale))))
+    return regions
+
+def ocr_region_keywords(gray_region):
+    """OCR one region and return the screenshot keywords it contains (None if OCR failed)"""
+    try:
+        text = pytesseract.image_to_string(Image.fromarray(gray_region), timeout=OCR_TIMEOUT).lower()
+        return tuple(keyword for keyword in SCREENSHOT_KEYWORDS if keyword in text)
+    except Exception as e:
+        print(f"OCR error: {e}")
+        return None
+
+def analyze_screenshot_text(image, context=None, exam_id=None):
     """Analyze text in image for screenshot-related content"""
     try:
-        # Convert to PIL Image for OCR
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(rgb_image)
-        
-        # Perform OCR
-        text = pytesseract.image_to_string(pil_image).lower()
-        
-        screenshot_keywords = [
-            'screenshot', 'capture', 'snip', 'print screen', 'prtsc',
-            'snapshot', 'screen grab', 'recording', 'save as'
-        ]
-        
-        found_keywords = [keyword for keyword in screenshot_keywords if keyword in text]
+        if context is None:
+            context = build_screenshot_context(image)
+        gray = context.gray if context.scale == 1.0 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
+        found_keywords = set()
+        pending = []
+        for x, y, w, h in ocr_candidate_regions(context, image.shape):
+            region = gray[y:y + h, x:x + w]
+            key = region_hash(region)
+            cached = ocr_cache.get(key)
+            if cached is not None:
+                found_keywords.update(cached)
+            elif ocr_rate_limiter.allow(exam_id):
+                pending.append((key, ocr_executor.submit(ocr_region_keywords, region)))
+        
+        for key, future in pending:
+            keywords = future.result()
+            if keywords is not None:
+                ocr_cache.put(key, keywords)
+                found_keywords.update(keywords)
         
         if found_keywords:
             return True, min(0.9, len(found_keywords) * 0.3)
@@ -838,93 +1112,239 @@ def analyze_screenshot_text(image):
         print(f"Text analysis error: {e}")
         return False, 0.0
 
-def detect_mouth_movement_enhanced(face_landmarks):
-    """ENHANCED mouth movement detection"""
+# Screenshot analysis (OCR especially) is too slow for the frame path: at most one frame per
+# student every SCREENSHOT_SAMPLE_INTERVAL seconds is analysed on a small worker pool, and the
+# finished result is merged into that student's next /detect response.
+SCREENSHOT_SAMPLE_INTERVAL = float(os.environ.get('SCREENSHOT_SAMPLE_INTERVAL', 30))
+SCREENSHOT_WORKERS = int(os.environ.get('SCREENSHOT_WORKERS', 2))
+SCREENSHOT_MAX_PENDING = int(os.environ.get('SCREENSHOT_MAX_PENDING', 8))
+screenshot_executor = ThreadPoolExecutor(max_workers=SCREENSHOT_WORKERS, thread_name_prefix='screenshot')
+screenshot_slots = threading.BoundedSemaphore(SCREENSHOT_MAX_PENDING)
+
+def run_screenshot_job(image, exam_id, student_id):
+    """Worker-side screenshot check; frees its queue slot when done"""
+    try:
+        return detect_screenshot_activity(image, exam_id, student_id)
+    finally:
+        screenshot_slots.release()
+
+def schedule_screenshot_check(session, image, exam_id, student_id, now=None):
+    """Queue a background screenshot check if the student is due and the pool has room"""
+    now = time.time() if now is None else now
+    if session.screenshot_job is not None or now - session.screenshot_checked_at < SCREENSHOT_SAMPLE_INTERVAL:
+        return False
+    if not screenshot_slots.acquire(blocking=False):
+        return False  # Pool saturated - try again on a later frame
+    session.screenshot_checked_at = now
+    try:
+        # The frame path keeps drawing on its image, so the worker gets its own copy
+        session.screenshot_job = screenshot_executor.submit(run_screenshot_job, image.copy(), exam_id, student_id)
+    except Exception:
+        screenshot_slots.release()
+        raise
+    return True
+
+def collect_screenshot_result(session):
+    """Pop a finished background screenshot result as (violations, confidence), or None"""
+    job = session.screenshot_job
+    if job is None or not job.done():
+        return None
+    session.screenshot_job = None
+    return job.result()
+
+def send_screenshot_alert(exam_id, student_socket_id, session, confidence, source="Screenshot activity"):
+    """Alert the teacher about screenshot activity, with a per-student cooldown"""
+    if not exam_id or confidence <= 0.5:
+        return
+    current_time = datetime.now()
+    last_alert = session.last_screenshot_alert
+    if last_alert and (current_time - last_alert).total_seconds() <= get_detection_plan(student_socket_id, session).screenshot_cooldown:
+        return
+    send_proctoring_alert(exam_id, {
+        "message": f"📸 {source} detected (confidence: {confidence:.1%})",
+        "type": "danger",
+        "severity": "high",
+        "timestamp": current_time.isoformat(),
+        "studentSocketId": student_socket_id,
+        "detectionType": "screenshot_attempt",
+        "confidence": confidence
+    })
+    session.last_screenshot_alert = current_time
+    session.screenshot_alerts += 1
+
+# ==================== SCREEN-SHARE INGEST ====================
+# Screen-share frames (getDisplayMedia) are split into tiles; each tile's signature is a coarse
+# 4x4 thumbnail, and only tiles that changed since the last analysed frame are sent through the
+# screenshot-tool/overlay-color and OCR checks, so a static exam page costs almost nothing.
+SCREEN_TILE_SIZE = int(os.environ.get('SCREEN_TILE_SIZE', 32))
+SCREEN_MAX_REGIONS = 8  # More dirty regions than this and the whole frame is analysed once
+
+def screen_tile_signatures(gray):
+    """(rows, cols, 2) uint64 signatures: each tile's 4x4 mean thumbnail at 16 gray levels"""
+    h, w = gray.shape
+    rows, cols = -(-h // SCREEN_TILE_SIZE), -(-w // SCREEN_TILE_SIZE)
+    thumb = cv2.resize(gray, (cols * 4, rows * 4), interpolation=cv2.INTER_AREA) >> 4
+    tiles = thumb.reshape(rows, 4, cols, 4).transpose(0, 2, 1, 3).reshape(rows, cols, 16)
+    return np.ascontiguousarray(tiles).view(np.uint64)
+
+def dirty_screen_regions(dirty, shape):
+    """Merge dirty tiles into pixel (x, y, w, h) boxes of connected tile groups"""
+    h, w = shape[:2]
+    count, _, stats, _ = cv2.connectedComponentsWithStats(dirty.astype(np.uint8), connectivity=8)
+    if count - 1 > SCREEN_MAX_REGIONS:
+        return [(0, 0, w, h)]
+    regions = []
+    for x, y, bw, bh, _ in stats[1:]:
+        px, py = x * SCREEN_TILE_SIZE, y * SCREEN_TILE_SIZE
+        regions.append((int(px), int(py), int(min(bw * SCREEN_TILE_SIZE, w - px)), int(min(bh * SCREEN_TILE_SIZE, h - py))))
+    return regions
+
+def analyze_screen_regions(image, regions, exam_id, student_id):
+    """Worker-side screenshot-tool and OCR checks over the changed regions of a screen-share frame"""
+    try:
+        violations = set()
+        confidence = 0.0
+        # Tool evidence is summed over the regions and scored once against the full frame, so a
+        # small colored widget is not judged as if it filled the screen
+        color_pixels = defaultdict(float)
+        selection_boxes = 0
+        for x, y, w, h in regions:
+            region = image[y:y + h, x:x + w]
+            context = build_screenshot_context(region)
+            
+            region_pixels, region_boxes = screenshot_tool_evidence(context)
+            for name, pixels in region_pixels.items():
+                color_pixels[name] += pixels
+            selection_boxes += region_boxes
+            
+            text_detected, text_confidence = analyze_screenshot_text(region, context, exam_id)
+            if text_detected:
+                violations.add("screenshot_related_text")
+                confidence = max(confidence, text_confidence)
+        
+        tool_detected, tool_confidence = score_screenshot_tools(color_pixels, selection_boxes, image.shape[0] * image.shape[1])
+        if tool_detected:
+            violations.add("screenshot_tool_detected")
+            confidence = max(confidence, tool_confidence)
+        
+        violations = sorted(violations)
+        if violations and exam_id:
+            screenshot_violations[exam_id].append({
+                "type": "screenshot_attempt",
+                "violations": violations,
+                "confidence": confidence,
+                "timestamp": datetime.now().isoformat(),
+                "student_id": student_id,
+                "source": "screen_share"
+            })
+        return violations, confidence
+    except Exception as e:
+        print(f"Screen region analysis error: {e}")
+        return [], 0.0
+    finally:
+        screenshot_slots.release()
+
+def detect_mouth_movement_enhanced(face_points):
+    """ENHANCED mouth movement detection (face_points: (478, 3) landmark array)"""
     try:
-        # Multiple mouth landmarks for better detection
-        upper_lip = face_landmarks.landmark[13]
-        lower_lip = face_landmarks.landmark[14]
-        mouth_left = face_landmarks.landmark[61]
-        mouth_right = face_landmarks.landmark[291]
-        mouth_center_upper = face_landmarks.landmark[0]
-        mouth_center_lower = face_landmarks.landmark[17]
-        
-        # Calculate multiple mouth metrics
-        mouth_openness_vertical = abs(upper_lip.y - lower_lip.y)
-        mouth_openness_center = abs(mouth_center_upper.y - mouth_center_lower.y)
-        mouth_width = abs(mouth_right.x - mouth_left.x)
-        mouth_corner_movement = abs(mouth_left.y - mouth_right.y)
+        mouth = face_points[MOUTH_IDX]
         
-        # ENHANCED talking detection with multiple factors
-        is_talking = (
-            mouth_openness_vertical > 0.035 or  # More sensitive
-            mouth_openness_center > 0.025 or    # Additional metric
-            mouth_width > 0.18 or               # More sensitive
-            mouth_corner_movement > 0.02        # New metric for corner movement
-        )
+        # Vertical openness, center openness, width and corner movement in one vector
+        metrics = np.abs(np.array([
+            mouth[0, 1] - mouth[1, 1],
+            mouth[4, 1] - mouth[5, 1],
+            mouth[3, 0] - mouth[2, 0],
+            mouth[2, 1] - mouth[3, 1]
+        ]))
         
-        mouth_confidence = (
-            (1 if mouth_openness_vertical > 0.035 else 0) +
-            (1 if mouth_openness_center > 0.025 else 0) +
-            (1 if mouth_width > 0.18 else 0) +
-            (1 if mouth_corner_movement > 0.02 else 0)
-        )
+        # ENHANCED talking detection with multiple factors
+        hits = metrics > MOUTH_THRESHOLDS
+        is_talking = bool(hits.any())
+        mouth_confidence = int(np.count_nonzero(hits))
         
-        return is_talking, mouth_openness_vertical, mouth_confidence
+        return is_talking, float(metrics[0]), mouth_confidence
         
     except Exception as e:
         print(f"Enhanced mouth movement detection error: {e}")
         return False, 0, 0
 
-def detect_head_pose_enhanced(face_landmarks, w, h):
-    """ENHANCED head pose detection with better accuracy"""
+# ==================== HEAD POSE (solvePnP) ====================
+# Canonical 3D face model (arbitrary units) in camera axes: x right, y down, z away from
+# the camera, so a face looking straight at the webcam solves to zero rotation.
+# Rows match HEAD_POSE_IDX.
+FACE_MODEL_3D = np.array([
+    (0.0, 0.0, 0.0),         # Nose tip
+    (0.0, 330.0, 65.0),      # Chin
+    (-225.0, -170.0, 135.0), # Outer eye corner (image left)
+    (225.0, -170.0, 135.0),  # Outer eye corner (image right)
+    (-150.0, 150.0, 125.0),  # Mouth corner (image left)
+    (150.0, 150.0, 125.0)    # Mouth corner (image right)
+], dtype=np.float64)
+
+HEAD_YAW_THRESHOLD = 25.0    # degrees before the head counts as turned
+HEAD_PITCH_THRESHOLD = 20.0  # degrees before the head counts as up/down
+HEAD_YAW_FULL = 40.0         # angle that maps to confidence 1.0
+HEAD_PITCH_FULL = 35.0
+NO_DISTORTION = np.zeros((4, 1), dtype=np.float64)
+
+camera_matrices = {}  # (w, h) -> approximate intrinsics for that frame resolution
+
+def get_camera_matrix(w, h):
+    """Approximate pinhole intrinsics for a resolution, cached per (w, h)"""
+    matrix = camera_matrices.get((w, h))
+    if matrix is None:
+        matrix = camera_matrices[(w, h)] = np.array([
+            [w, 0, w / 2],
+            [0, w, h / 2],
+            [0, 0, 1]
+        ], dtype=np.float64)
+    return matrix
+
+def detect_head_pose_enhanced(face_points, w, h, session=None):
+    """3D head pose from solvePnP; returns (pose label, confidence, {yaw, pitch, roll} in degrees)
+
+    When a session is given, its previous solution seeds the iterative solver.
+    """
     try:
-        nose_tip = face_landmarks.landmark[1]
-        left_eye = face_landmarks.landmark[33]
-        right_eye = face_landmarks.landmark[263]
-        chin = face_landmarks.landmark[152]
-        forehead = face_landmarks.landmark[10]
-        left_ear = face_landmarks.landmark[234]
-        right_ear = face_landmarks.landmark[454]
-        
-        # Calculate multiple pose metrics
-        eye_center_x = (left_eye.x + right_eye.x) / 2
-        horizontal_diff = abs(nose_tip.x - eye_center_x)
-        
-        # Face symmetry analysis
-        left_side_length = abs(left_ear.x - nose_tip.x)
-        right_side_length = abs(right_ear.x - nose_tip.x)
-        symmetry_ratio = min(left_side_length, right_side_length) / max(left_side_length, right_side_length)
-        
-        # Calculate head tilt with multiple points
-        face_vertical = abs(chin.y - forehead.y)
-        left_vertical = abs(left_eye.y - chin.y)
-        right_vertical = abs(right_eye.y - chin.y)
+        image_points = face_points[HEAD_POSE_IDX, :2].astype(np.float64) * (w, h)
+        camera_matrix = get_camera_matrix(w, h)
+        
+        guess = session.pose_guess if session is not None else None
+        if guess is not None:
+            ok, rvec, tvec = cv2.solvePnP(
+                FACE_MODEL_3D, image_points, camera_matrix, NO_DISTORTION,
+                rvec=guess[0].copy(), tvec=guess[1].copy(), useExtrinsicGuess=True,
+                flags=cv2.SOLVEPNP_ITERATIVE
+            )
+        else:
+            ok, rvec, tvec = cv2.solvePnP(
+                FACE_MODEL_3D, image_points, camera_matrix, NO_DISTORTION,
+                flags=cv2.SOLVEPNP_ITERATIVE
+            )
         
-        pose = "head forward"
-        tilt = "upright"
-        confidence = 1.0
+        if not ok:
+            if session is not None:
+                session.pose_guess = None
+            return "unknown", 0.0, None
         
-        # ENHANCED Horizontal head rotation with symmetry check
-        if horizontal_diff > 0.05 and symmetry_ratio < 0.85:  # More sensitive with symmetry
-            if nose_tip.x < eye_center_x:
-                pose = "head turned right"
-                confidence = 1 - symmetry_ratio
-            else:
-                pose = "head turned left"
-                confidence = 1 - symmetry_ratio
+        if session is not None:
+            session.pose_guess = (rvec, tvec)
         
-        # ENHANCED Vertical head tilt
-        vertical_threshold = 0.25  # More sensitive
-        vertical_diff = abs(left_vertical - right_vertical)
+        rotation, _ = cv2.Rodrigues(rvec)
+        pitch, yaw, roll = cv2.RQDecomp3x3(rotation)[0]
+        angles = {"yaw": round(float(yaw), 1), "pitch": round(float(pitch), 1), "roll": round(float(roll), 1)}
         
-        if vertical_diff > vertical_threshold:
-            if chin.y > (left_eye.y + right_eye.y) / 2:
-                tilt = "head down"
-                confidence = max(confidence, vertical_diff)
-            else:
-                tilt = "head up"
-                confidence = max(confidence, vertical_diff)
+        pose = "head forward"
+        if yaw > HEAD_YAW_THRESHOLD:
+            pose = "head turned right"
+        elif yaw < -HEAD_YAW_THRESHOLD:
+            pose = "head turned left"
+        
+        tilt = "upright"
+        if pitch > HEAD_PITCH_THRESHOLD:
+            tilt = "head down"
+        elif pitch < -HEAD_PITCH_THRESHOLD:
+            tilt = "head up"
         
         # Combine pose and tilt
         if pose != "head forward" and tilt != "upright":
@@ -936,65 +1356,82 @@ def detect_head_pose_enhanced(face_landmarks, w, h):
         else:
             final_pose = "head forward"
         
-        return final_pose, confidence
+        confidence = min(1.0, max(abs(yaw) / HEAD_YAW_FULL, abs(pitch) / HEAD_PITCH_FULL))
+        
+        return final_pose, float(confidence), angles
                 
     except Exception as e:
         print(f"Enhanced head pose error: {e}")
-        return "unknown", 0.0
+        return "unknown", 0.0, None
+
+# ==================== BATCHED FACE / HAND ANALYSIS ====================
+# All faces and hands of a frame are analysed in one pass over stacked arrays; the
+# multi-person, phone, mouse and gesture detectors only read the shared features.
+def face_boxes_to_array(face_results):
+    """Relative bounding boxes of all face detections as an (F, 4) array: xmin, ymin, width, height"""
+    if not face_results or not face_results.detections:
+        return np.empty((0, 4), dtype=np.float32)
+    boxes = (detection.location_data.relative_bounding_box for detection in face_results.detections)
+    return np.array([(b.xmin, b.ymin, b.width, b.height) for b in boxes], dtype=np.float32)
+
+def analyze_faces(face_boxes):
+    """Centers, sizes and the pairwise center distance matrix for all faces"""
+    centers = face_boxes[:, :2] + face_boxes[:, 2:] / 2
+    diff = centers[:, None, :] - centers[None, :, :]
+    return {
+        "count": len(face_boxes),
+        "centers": centers,
+        "sizes": face_boxes[:, 2] * face_boxes[:, 3],
+        "distances": np.sqrt((diff ** 2).sum(axis=-1))  # (F, F)
+    }
+
+def analyze_hands(hand_points, face_centers):
+    """Shared per-hand features for phone, mouse and gesture detection
+
+    hand_points is (H, 21, 3) and face_centers (F, 2); the first face is the student.
+    """
+    wrist = hand_points[:, HAND_WRIST, :2]
+    tips = hand_points[:, FINGER_TIPS_IDX, :2]  # (H, 5, 2): thumb, index, middle, ring, pinky
+    face_distances = np.linalg.norm(wrist[:, None, :] - face_centers[None, :, :], axis=-1)  # (H, F)
+    return {
+        "count": len(hand_points),
+        "wrist": wrist,
+        "tips": tips,
+        "palm": hand_points[:, HAND_PALM, :2],
+        "face_distances": face_distances,
+        "student_face_distance": face_distances[:, 0] if face_centers.shape[0] else np.full(len(hand_points), np.inf),
+        "thumb_index_distance": np.linalg.norm(tips[:, 0] - tips[:, 1], axis=1),
+        "tips_above_wrist": tips[:, :, 1] < wrist[:, None, 1]  # (H, 5)
+    }
 
-def detect_phone_usage_enhanced(hands_results, face_center_x, face_center_y, w, h):
-    """ENHANCED phone detection with multiple factors"""
+def detect_phone_usage_enhanced(hands, w, h):
+    """ENHANCED phone detection with multiple factors (hands: analyze_hands() features)"""
     try:
-        if not hands_results.multi_hand_landmarks:
+        if not hands or hands["count"] == 0:
             return False, 0.0
-            
-        phone_confidence = 0.0
-        max_confidence = 0.0
-        
-        for hand_landmarks in hands_results.multi_hand_landmarks:
-            wrist = hand_landmarks.landmark[0]
-            thumb_tip = hand_landmarks.landmark[4]
-            index_tip = hand_landmarks.landmark[8]
-            middle_tip = hand_landmarks.landmark[12]
-            palm_center = hand_landmarks.landmark[9]
-            
-            # Multiple detection factors
-            hand_face_distance = np.sqrt((wrist.x - face_center_x)**2 + (wrist.y - face_center_y)**2)
-            thumb_index_distance = np.sqrt((thumb_tip.x - index_tip.x)**2 + (thumb_tip.y - index_tip.y)**2)
-            palm_orientation = abs(palm_center.x - wrist.x)  # Palm facing direction
-            
-            # ENHANCED phone detection conditions
-            confidence_factors = []
-            
+        
+        wrist = hands["wrist"]
+        hand_face_distance = hands["student_face_distance"]
+        thumb_index_distance = hands["thumb_index_distance"]
+        palm_orientation = np.abs(hands["palm"][:, 0] - wrist[:, 0])  # Palm facing direction
+        fingers_extended = np.count_nonzero(hands["tips_above_wrist"][:, 1:3], axis=1)  # index, middle
+        
+        # ENHANCED phone detection conditions (0 = factor not present)
+        factors = np.stack([
             # Distance factor (closer = higher confidence)
-            if hand_face_distance < 0.15:
-                confidence_factors.append(1.0)
-            elif hand_face_distance < 0.25:
-                confidence_factors.append(0.7)
-            elif hand_face_distance < 0.35:
-                confidence_factors.append(0.3)
-            
+            np.select([hand_face_distance < 0.15, hand_face_distance < 0.25, hand_face_distance < 0.35], [1.0, 0.7, 0.3], 0.0),
             # Grip factor (pinching gesture)
-            if thumb_index_distance < 0.03:
-                confidence_factors.append(1.0)
-            elif thumb_index_distance < 0.05:
-                confidence_factors.append(0.5)
-            
+            np.select([thumb_index_distance < 0.03, thumb_index_distance < 0.05], [1.0, 0.5], 0.0),
             # Palm orientation (vertical grip typical for phones)
-            if palm_orientation < 0.1:  # Vertical orientation
-                confidence_factors.append(0.8)
-            
+            np.where(palm_orientation < 0.1, 0.8, 0.0),
             # Multiple fingers extended (typing/scroll gesture)
-            fingers_extended = 0
-            if index_tip.y < wrist.y: fingers_extended += 1
-            if middle_tip.y < wrist.y: fingers_extended += 1
-            if fingers_extended >= 2:
-                confidence_factors.append(0.6)
-            
-            # Calculate overall confidence
-            if confidence_factors:
-                hand_confidence = sum(confidence_factors) / len(confidence_factors)
-                max_confidence = max(max_confidence, hand_confidence)
+            np.where(fingers_extended >= 2, 0.6, 0.0)
+        ], axis=1)
+        
+        # Average of the factors present for each hand, best hand wins
+        present = np.count_nonzero(factors, axis=1)
+        hand_confidence = np.where(present > 0, factors.sum(axis=1) / np.maximum(present, 1), 0.0)
+        max_confidence = float(hand_confidence.max())
         
         # Require moderate confidence for phone detection
         return max_confidence > 0.4, max_confidence
@@ -1003,58 +1440,33 @@ def detect_phone_usage_enhanced(hands_results, face_center_x, face_center_y, w,
         print(f"Enhanced phone detection error: {e}")
         return False, 0.0
 
-def detect_mouse_usage_enhanced(hands_results, pose_results, w, h):
-    """ENHANCED mouse usage detection"""
+# Confidence contributed by each mouse-grip condition (see detect_mouse_usage_enhanced)
+MOUSE_FACTOR_WEIGHTS = np.array([0.8, 1.0, 0.8, 0.6, 0.7, 0.9])
+
+def detect_mouse_usage_enhanced(hands, pose_points, w, h):
+    """ENHANCED mouse usage detection (hands: analyze_hands() features)"""
     try:
-        if not hands_results.multi_hand_landmarks:
+        if not hands or hands["count"] == 0:
             return False, 0.0
-            
-        mouse_confidence = 0.0
-        
-        for hand_landmarks in hands_results.multi_hand_landmarks:
-            wrist = hand_landmarks.landmark[0]
-            index_tip = hand_landmarks.landmark[8]
-            middle_tip = hand_landmarks.landmark[12]
-            thumb_tip = hand_landmarks.landmark[4]
-            pinky_tip = hand_landmarks.landmark[20]
-            
-            # Mouse usage patterns
-            hand_position = "right" if wrist.x > 0.5 else "left"
-            
-            # Finger configuration analysis
-            index_extended = index_tip.y < wrist.y - 0.05  # Clearly extended
-            middle_relaxed = middle_tip.y > wrist.y + 0.02  # Clearly relaxed
-            thumb_position = abs(thumb_tip.x - index_tip.x) < 0.08  # Thumb near index
-            
-            # Hand stability and shape
-            hand_flatness = abs(wrist.y - pinky_tip.y) < 0.1  # Flat hand
-            finger_alignment = abs(index_tip.y - middle_tip.y) > 0.03  # Index higher than middle
-            
-            # ENHANCED mouse detection conditions
-            confidence_factors = []
-            
-            if hand_position == "right":  # Typically right side for mouse
-                confidence_factors.append(0.8)
-            
-            if index_extended:
-                confidence_factors.append(1.0)
-            
-            if middle_relaxed:
-                confidence_factors.append(0.8)
-            
-            if thumb_position:
-                confidence_factors.append(0.6)
-            
-            if hand_flatness:
-                confidence_factors.append(0.7)
-            
-            if finger_alignment:
-                confidence_factors.append(0.9)
-            
-            # Calculate confidence
-            if confidence_factors:
-                hand_confidence = sum(confidence_factors) / len(confidence_factors)
-                mouse_confidence = max(mouse_confidence, hand_confidence)
+        
+        wrist = hands["wrist"]
+        tips = hands["tips"]
+        thumb_tip, index_tip, middle_tip, pinky_tip = tips[:, 0], tips[:, 1], tips[:, 2], tips[:, 4]
+        
+        # Mouse usage patterns, one row per hand
+        conditions = np.stack([
+            wrist[:, 0] > 0.5,                                # Typically right side for mouse
+            index_tip[:, 1] < wrist[:, 1] - 0.05,             # Index clearly extended
+            middle_tip[:, 1] > wrist[:, 1] + 0.02,            # Middle clearly relaxed
+            np.abs(thumb_tip[:, 0] - index_tip[:, 0]) < 0.08, # Thumb near index
+            np.abs(wrist[:, 1] - pinky_tip[:, 1]) < 0.1,      # Flat hand
+            np.abs(index_tip[:, 1] - middle_tip[:, 1]) > 0.03 # Index higher than middle
+        ], axis=1)
+        
+        # Average weight of the conditions met for each hand, best hand wins
+        met = np.count_nonzero(conditions, axis=1)
+        hand_confidence = np.where(met > 0, (conditions * MOUSE_FACTOR_WEIGHTS).sum(axis=1) / np.maximum(met, 1), 0.0)
+        mouse_confidence = float(hand_confidence.max())
         
         return mouse_confidence > 0.5, mouse_confidence
                 
@@ -1062,89 +1474,97 @@ def detect_mouse_usage_enhanced(hands_results, pose_results, w, h):
         print(f"Enhanced mouse detection error: {e}")
         return False, 0.0
 
-def detect_multiple_people_enhanced(face_results, img, w, h):
-    """ENHANCED multiple people detection"""
+def detect_multiple_people_enhanced(faces):
+    """ENHANCED multiple people detection (faces: analyze_faces() features)"""
     try:
-        if not face_results.detections:
-            return False, 0.0
-        
-        face_count = len(face_results.detections)
+        face_count = faces["count"]
         
         if face_count <= 1:
             return False, 0.0
         
-        # Calculate face positions and sizes
-        face_bboxes = []
-        for detection in face_results.detections:
-            bbox = detection.location_data.relative_bounding_box
-            x_center = bbox.xmin + bbox.width / 2
-            y_center = bbox.ymin + bbox.height / 2
-            size = bbox.width * bbox.height
-            
-            face_bboxes.append({
-                'center': (x_center, y_center),
-                'size': size,
-                'bbox': bbox
-            })
+        # More faces = higher confidence
+        confidence = min(1.0, face_count / 3.0)
         
-        # Check if faces are distinct (not reflections/artifacts)
-        distinct_faces = True
-        confidence = min(1.0, face_count / 3.0)  # More faces = higher confidence
-        
-        # Additional checks for distinct faces
-        if face_count >= 2:
-            # Check if faces have significantly different sizes (likely different people)
-            sizes = [face['size'] for face in face_bboxes]
-            size_variance = np.var(sizes)
-            if size_variance > 0.01:  # Significant size difference
-                confidence += 0.2
-            
-            # Check face positions
-            centers = [face['center'] for face in face_bboxes]
-            avg_distance = 0
-            for i in range(len(centers)):
-                for j in range(i+1, len(centers)):
-                    dist = np.sqrt((centers[i][0]-centers[j][0])**2 + (centers[i][1]-centers[j][1])**2)
-                    avg_distance += dist
-            
-            if len(centers) > 1:
-                avg_distance /= (len(centers)*(len(centers)-1)/2)
-                if avg_distance > 0.3:  # Faces are far apart
-                    confidence += 0.3
+        # Check if faces have significantly different sizes (likely different people)
+        if np.var(faces["sizes"]) > 0.01:
+            confidence += 0.2
+        
+        # Average pairwise distance between face centers (upper triangle of the distance matrix)
+        avg_distance = faces["distances"][np.triu_indices(face_count, k=1)].mean()
+        if avg_distance > 0.3:  # Faces are far apart
+            confidence += 0.3
         
-        return face_count >= 2, min(confidence, 1.0)
+        return True, min(confidence, 1.0)
         
     except Exception as e:
         print(f"Enhanced multiple people detection error: {e}")
         return False, 0.0
 
 # ==================== ENHANCED AUDIO DETECTION ====================
-def detect_audio_violations(audio_data, sample_rate=16000):
-    """Detect suspicious audio patterns"""
+AudioFeatures = namedtuple('AudioFeatures', ['rms', 'voice_ratio', 'zcr', 'samples'])
+
+VOICE_BAND_HZ = (85, 255)  # Voice fundamental range (85-255 Hz for male, 165-255 Hz for female)
+voice_band_masks = {}  # (length, sample_rate) -> boolean mask over rfft bins
+
+def get_voice_band_mask(length, sample_rate):
+    """Voice-band mask over np.fft.rfft bins, cached per (length, sample_rate)"""
+    mask = voice_band_masks.get((length, sample_rate))
+    if mask is None:
+        frequencies = np.fft.rfftfreq(length, d=1.0 / sample_rate)
+        mask = voice_band_masks[(length, sample_rate)] = (
+            (frequencies > VOICE_BAND_HZ[0]) & (frequencies < VOICE_BAND_HZ[1])
+        )
+    return mask
+
+def extract_audio_features(audio_data, sample_rate=16000):
+    """Single spectral pass over 16-bit PCM (bytes or int16 array): RMS, voice-band energy ratio and zero-crossing rate"""
+    if audio_data is None or len(audio_data) == 0:
+        return None
+    audio_array = audio_data if isinstance(audio_data, np.ndarray) else np.frombuffer(audio_data, dtype=np.int16)
+    n = len(audio_array)
+    if n == 0:
+        return None
+    
+    rms = audioop.rms(audio_array, 2)  # Volume
+    
+    # Real FFT covers the non-negative half of the spectrum; mirror it to get the full-spectrum total
+    magnitude = np.abs(np.fft.rfft(audio_array))
+    total_energy = 2 * magnitude.sum() - magnitude[0] - (magnitude[-1] if n % 2 == 0 else 0)
+    voice_energy = 2 * magnitude[get_voice_band_mask(n, sample_rate)].sum()
+    voice_ratio = float(voice_energy / total_energy) if total_energy > 0 else 0
+    
+    # Zero-crossing rate for speech detection
+    zcr = np.count_nonzero(np.diff(np.signbit(audio_array))) / n
+    
+    return AudioFeatures(rms, voice_ratio, zcr, n)
+
+def extract_audio_features_batch(windows, sample_rate=16000):
+    """extract_audio_features over a (windows, samples) int16 array in one vectorized pass"""
+    count, n = windows.shape
+    if count == 0 or n == 0:
+        return []
+    samples = windows.astype(np.float64)
+    
+    rms = np.sqrt(np.einsum('ij,ij->i', samples, samples) / n).astype(np.int64)  # Same truncation as audioop.rms
+    
+    magnitude = np.abs(np.fft.rfft(samples, axis=1))
+    total_energy = 2 * magnitude.sum(axis=1) - magnitude[:, 0] - (magnitude[:, -1] if n % 2 == 0 else 0)
+    voice_energy = 2 * magnitude[:, get_voice_band_mask(n, sample_rate)].sum(axis=1)
+    voice_ratio = np.divide(voice_energy, total_energy, out=np.zeros(count), where=total_energy > 0)
+    
+    zcr = np.count_nonzero(np.diff(np.signbit(windows), axis=1), axis=1) / n
+    
+    return [AudioFeatures(int(rms[i]), float(voice_ratio[i]), float(zcr[i]), n) for i in range(count)]
+
+def detect_audio_violations(audio_data, sample_rate=16000, features=None):
+    """Detect suspicious audio patterns (pass precomputed AudioFeatures to skip the spectral pass)"""
     try:
-        if not audio_data:
+        if features is None:
+            features = extract_audio_features(audio_data, sample_rate)
+        if features is None:
             return [], 0.0
-            
-        audio_array = np.frombuffer(audio_data, dtype=np.int16)
-        
-        if len(audio_array) == 0:
-            return [], 0.0
-        
-        # Calculate audio features
-        rms = audioop.rms(audio_data, 2)
-        fft = np.fft.fft(audio_array)
-        frequencies = np.fft.fftfreq(len(fft))
-        magnitude = np.abs(fft)
         
-        # Voice detection
-        voice_mask = (np.abs(frequencies) > 85/sample_rate) & (np.abs(frequencies) < 255/sample_rate)
-        voice_energy = np.sum(magnitude[voice_mask])
-        total_energy = np.sum(magnitude)
-        voice_ratio = voice_energy / total_energy if total_energy > 0 else 0
-        
-        # Zero-crossing rate for speech detection
-        zero_crossings = np.sum(np.diff(np.signbit(audio_array)) != 0)
-        zcr = zero_crossings / len(audio_array)
+        rms, voice_ratio = features.rms, features.voice_ratio
         
         violations = []
         confidence = 0.0
@@ -1166,85 +1586,52 @@ def detect_audio_violations(audio_data, sample_rate=16000):
         return [], 0.0
 
 # ==================== ENHANCED HAND GESTURE DETECTION ====================
-def detect_suspicious_gestures(hand_landmarks, face_center_x, face_center_y):
-    """Detect suspicious hand gestures"""
+def detect_suspicious_gestures(hands):
+    """Detect suspicious hand gestures (hands: analyze_hands() features)"""
     try:
-        if not hand_landmarks:
+        if not hands or hands["count"] == 0:
             return [], 0.0
-            
+        
+        wrist_y = hands["wrist"][:, 1]
+        tips_y = hands["tips"][:, :, 1]  # thumb, index, middle, ring, pinky
+        
+        # Detect hand covering face
+        covering = hands["student_face_distance"] < 0.1
+        
+        # Detect pointing gestures (index up, thumb/middle/pinky below the wrist)
+        index_extended = tips_y[:, 1] < wrist_y - 0.05
+        other_fingers_closed = (tips_y[:, [0, 2, 4]] > wrist_y[:, None]).all(axis=1)
+        pointing = index_extended & other_fingers_closed
+        
+        # Detect counting gestures (multiple fingers extended)
+        counting = np.count_nonzero(hands["tips_above_wrist"], axis=1) >= 3
+        
         violations = []
-        max_confidence = 0.0
-        
-        for landmarks in hand_landmarks:
-            # Get key hand points
-            wrist = landmarks.landmark[0]
-            thumb_tip = landmarks.landmark[4]
-            index_tip = landmarks.landmark[8]
-            middle_tip = landmarks.landmark[12]
-            pinky_tip = landmarks.landmark[20]
-            
-            # Calculate distances and positions
-            hand_face_distance = np.sqrt((wrist.x - face_center_x)**2 + (wrist.y - face_center_y)**2)
-            
-            # Detect hand covering face
-            if hand_face_distance < 0.1:
+        for i in range(hands["count"]):
+            if covering[i]:
                 violations.append("hand_covering_face")
-                max_confidence = max(max_confidence, 0.8)
-            
-            # Detect pointing gestures
-            index_extended = index_tip.y < wrist.y - 0.05
-            other_fingers_closed = (middle_tip.y > wrist.y and thumb_tip.y > wrist.y and pinky_tip.y > wrist.y)
-            
-            if index_extended and other_fingers_closed:
+            if pointing[i]:
                 violations.append("pointing_gesture")
-                max_confidence = max(max_confidence, 0.6)
-            
-            # Detect counting gestures (multiple fingers extended)
-            extended_fingers = 0
-            finger_tips = [4, 8, 12, 16, 20]  # thumb, index, middle, ring, pinky
-            for tip_idx in finger_tips:
-                if landmarks.landmark[tip_idx].y < wrist.y:
-                    extended_fingers += 1
-            
-            if extended_fingers >= 3:
+            if counting[i]:
                 violations.append("multiple_fingers_extended")
-                max_confidence = max(max_confidence, 0.5)
         
-        return violations, max_confidence
+        max_confidence = max(0.8 * covering.any(), 0.6 * pointing.any(), 0.5 * counting.any())
+        
+        return violations, float(max_confidence)
         
     except Exception as e:
         print(f"Hand gesture detection error: {e}")
         return [], 0.0
 
-def analyze_audio_enhanced(audio_data, sample_rate=16000):
-    """ENHANCED audio analysis with better detection"""
+def analyze_audio_enhanced(audio_data, sample_rate=16000, features=None):
+    """ENHANCED audio analysis with better detection (pass precomputed AudioFeatures to skip the spectral pass)"""
     try:
-        if not audio_data:
-            return "silent", 0, 0.0
-            
-        # Convert audio data to numpy array
-        audio_array = np.frombuffer(audio_data, dtype=np.int16)
-        
-        if len(audio_array) == 0:
+        if features is None:
+            features = extract_audio_features(audio_data, sample_rate)
+        if features is None:
             return "silent", 0, 0.0
         
-        # Calculate multiple audio features
-        rms = audioop.rms(audio_data, 2)  # Volume
-        
-        # Spectral analysis
-        fft = np.fft.fft(audio_array)
-        frequencies = np.fft.fftfreq(len(fft))
-        magnitude = np.abs(fft)
-        
-        # Voice frequency range (85-255 Hz for male, 165-255 Hz for female)
-        voice_mask = (np.abs(frequencies) > 85/sample_rate) & (np.abs(frequencies) < 255/sample_rate)
-        voice_energy = np.sum(magnitude[voice_mask])
-        total_energy = np.sum(magnitude)
-        voice_ratio = voice_energy / total_energy if total_energy > 0 else 0
-        
-        # Zero-crossing rate
-        zero_crossings = np.sum(np.diff(np.signbit(audio_array)) != 0)
-        zcr = zero_crossings / len(audio_array)
+        rms, voice_ratio, zcr = features.rms, features.voice_ratio, features.zcr
         
         # ENHANCED speech detection with multiple factors
         speaking_confidence = 0.0
@@ -1279,6 +1666,162 @@ def analyze_audio_enhanced(audio_data, sample_rate=16000):
         print(f"Enhanced audio analysis error: {e}")
         return "error", 0, 0.0
 
+# ==================== ATTENTION SCORING ====================
+Signal = namedtuple('Signal', ['type', 'confidence', 'weight'])
+
+# Relative weight of each signal type in the attention score. The defaults reproduce the penalties
+# the old activity-string parser produced: gaze confidence is a raw pupil offset (~0.03) that it
+# divided by 100, and the no-face activity carried no confidence, so it cost nothing.
+SIGNAL_WEIGHTS = {
+    'multiple_people': 1.0,
+    'gaze_deviation': 0.01,
+    'head_pose_deviation': 1.0,
+    'mouth_movement': 1.0,
+    'mouse_usage': 1.0,
+    'suspicious_gesture': 1.0,
+    'no_face_detected': 0.0,
+    'audio_detection': 1.0,
+    'screenshot_attempt': 1.0
+}
+
+# Each signal costs min(penalty_cap, penalty_scale * weight * confidence) points off base
+ATTENTION_SCORE_CONFIG = {
+    'base': 100,
+    'penalty_scale': 20,
+    'penalty_cap': 25
+}
+
+def make_signal(signal_type, confidence):
+    """Build a signal record with the configured weight for its type"""
+    return Signal(signal_type, float(confidence), SIGNAL_WEIGHTS.get(signal_type, 1.0))
+
+def calculate_attention_score(signals, config=ATTENTION_SCORE_CONFIG):
+    """Attention score (0-100) from structured signals, vectorized over all signals"""
+    if not signals:
+        return config['base']
+    confidences = np.fromiter((signal.confidence for signal in signals), dtype=np.float64, count=len(signals))
+    weights = np.fromiter((signal.weight for signal in signals), dtype=np.float64, count=len(signals))
+    penalties = np.minimum(config['penalty_cap'], config['penalty_scale'] * weights * np.clip(confidences, 0.0, 1.0))
+    return max(0, round(config['base'] - float(penalties.sum()), 1))
+
+# ==================== TEMPORAL SMOOTHING ====================
+# Gaze, head pose and mouth decisions go through a per-student EWMA with hysteresis and a
+# minimum dwell time, so alerts (and attempt deductions) fire only on sustained deviations.
+SMOOTH_GAZE, SMOOTH_HEAD_POSE, SMOOTH_MOUTH = range(3)
+SMOOTHING_CONFIG = {
+    #          gaze   head   mouth
+    'alpha':  (0.5,   0.5,   0.5),   # EWMA weight of the newest frame
+    'on':     (0.05,  0.6,   0.75),  # smoothed value that activates the signal
+    'off':    (0.03,  0.45,  0.5),   # smoothed value that clears it again
+    'dwell':  (4.0,   4.0,   4.0),   # seconds above 'on' before activating (~2 frames at 5 s)
+    'refire': (30.0,  30.0,  30.0)   # seconds between repeated alerts while still active
+}
+
+def get_signal_smoother(session):
+    """Get (or create) the smoothing state for a student session"""
+    if session.smoother is None:
+        session.smoother = SignalSmoother(**SMOOTHING_CONFIG)
+    return session.smoother
+
+# ==================== AUDIO ENCODINGS ====================
+# Clients may send 8 kHz audio and/or μ-law, A-law or IMA ADPCM instead of 16 kHz PCM
+# (2-4x fewer bytes per sample). The format is negotiated per exam; untagged payloads are PCM16.
+AUDIO_ENCODINGS = ('pcm16', 'ulaw', 'alaw', 'adpcm')
+AUDIO_SAMPLE_RATES = (8000, 16000)
+DEFAULT_AUDIO_FORMAT = {
+    'encoding': os.environ.get('AUDIO_ENCODING', 'ulaw'),
+    'sampleRate': int(os.environ.get('AUDIO_SAMPLE_RATE', 8000))
+}
+exam_audio_formats = {}  # exam_id -> {'encoding', 'sampleRate'}
+
+def parse_sample_rate(value, default=16000):
+    """Client-supplied sample rate as an int if it is a supported one, else None"""
+    try:
+        sample_rate = int(default if value is None else value)
+    except (TypeError, ValueError):
+        return None
+    return sample_rate if sample_rate in AUDIO_SAMPLE_RATES else None
+
+def decode_audio(payload, encoding='pcm16', adpcm_state=None):
+    """Decode an audio payload to int16 samples (zero-copy views over the decoded bytes); returns (samples, adpcm_state)"""
+    if encoding == 'pcm16':
+        return np.frombuffer(payload, dtype=np.int16, count=len(payload) // 2), adpcm_state
+    if encoding == 'ulaw':
+        return np.frombuffer(audioop.ulaw2lin(payload, 2), dtype=np.int16), adpcm_state
+    if encoding == 'alaw':
+        return np.frombuffer(audioop.alaw2lin(payload, 2), dtype=np.int16), adpcm_state
+    if encoding == 'adpcm':
+        pcm, adpcm_state = audioop.adpcm2lin(payload, 2, adpcm_state)
+        return np.frombuffer(pcm, dtype=np.int16), adpcm_state
+    raise ValueError(f"Unsupported audio encoding: {encoding}")
+
+def decode_audio_base64(audio_base64, encoding='pcm16'):
+    """Decode a base64 (optionally data-URL) audio payload to int16 samples"""
+    payload = base64.b64decode(audio_base64.split(',')[1] if "," in audio_base64 else audio_base64)
+    return decode_audio(payload, encoding)[0]
+
+def get_exam_audio_format(exam_id):
+    """Audio format students of an exam should send"""
+    return exam_audio_formats.get(exam_id, DEFAULT_AUDIO_FORMAT)
+
+@sio.event
+def set_audio_format(sid, data):
+    """Teacher sets the audio encoding/sample rate for an exam"""
+    exam_id = data.get('examId')
+    encoding = data.get('encoding', DEFAULT_AUDIO_FORMAT['encoding'])
+    sample_rate = parse_sample_rate(data.get('sampleRate'), DEFAULT_AUDIO_FORMAT['sampleRate'])
+    if not exam_id:
+        return {"error": "Missing examId"}
+    if encoding not in AUDIO_ENCODINGS or sample_rate is None:
+        return {"error": f"Unsupported audio format: {encoding} @ {data.get('sampleRate')} Hz"}
+    
+    audio_format = exam_audio_formats[exam_id] = {'encoding': encoding, 'sampleRate': sample_rate}
+    sio.emit('audio-format-update', {'examId': exam_id, **audio_format}, room=f"exam-{exam_id}")
+    return {"status": "audio_format_updated", **audio_format}
+
+@sio.event
+def get_audio_format(sid, data):
+    """Student negotiates the audio format: exam format if the client supports it, else PCM16"""
+    audio_format = get_exam_audio_format(data.get('examId'))
+    supported = data.get('supported', AUDIO_ENCODINGS)
+    if audio_format['encoding'] not in supported:
+        return {'encoding': 'pcm16', 'sampleRate': audio_format['sampleRate']}
+    return dict(audio_format)
+
+def send_audio_alert(exam_id, student_id, session, audio_status, confidence):
+    """Alert the teacher about speaking/whispering, with a per-student cooldown"""
+    if not exam_id or audio_status not in ["speaking", "whispering"] or confidence <= 0.5:
+        return
+    
+    # Check if this is a repeated alert (prevent spam)
+    current_time = datetime.now()
+    last_alert = session.last_audio_alert
+    plan = get_detection_plan(student_id, session)
+    alert_cooldown = plan.whispering_cooldown if audio_status == "whispering" else plan.speaking_cooldown
+    
+    if last_alert and (current_time - last_alert).total_seconds() <= alert_cooldown:
+        return
+    
+    if audio_status == "whispering":
+        alert_message = f"🔇 Whispering detected (confidence: {confidence:.1%})"
+        alert_type = "warning"
+    else:
+        alert_message = f"🗣️ Speaking detected (confidence: {confidence:.1%})"
+        alert_type = "danger"
+    
+    send_proctoring_alert(exam_id, {
+        "message": alert_message,
+        "type": alert_type,
+        "severity": "high" if audio_status == "speaking" else "medium",
+        "timestamp": current_time.isoformat(),
+        "studentSocketId": student_id,
+        "detectionType": "speaking_detected" if audio_status == "speaking" else "audio_detection",
+        "confidence": confidence
+    })
+    
+    session.last_audio_alert = current_time
+    session.audio_alerts += 1
+
 # Enhanced audio processing endpoint
 @app.route('/process_audio', methods=['POST'])
 def process_audio():
@@ -1290,65 +1833,141 @@ def process_audio():
         exam_id = data.get('exam_id')
         student_id = data.get('student_id')
         audio_base64 = data.get('audio')
+        encoding = data.get('encoding', 'pcm16')
+        sample_rate = parse_sample_rate(data.get('sampleRate'))
         
         # Decode audio
+        if encoding not in AUDIO_ENCODINGS:
+            return jsonify({"error": f"Unsupported audio encoding: {encoding}"}), 400
+        if sample_rate is None:
+            return jsonify({"error": f"Unsupported sample rate: {data.get('sampleRate')}"}), 400
         try:
-            audio_data = base64.b64decode(audio_base64.split(',')[1] if "," in audio_base64 else audio_base64)
+            audio_data = decode_audio_base64(audio_base64, encoding)
         except:
             return jsonify({"error": "Invalid audio data"}), 400
         
         # Analyze audio with enhanced detection
-        audio_status, volume, confidence = analyze_audio_enhanced(audio_data)
-        
-        # Store audio data for trend analysis
-        audio_data_buffer.append(volume)
+        audio_status, volume, confidence = analyze_audio_enhanced(audio_data, sample_rate)
         
-        # Check for suspicious audio patterns with confidence threshold
-        if exam_id and audio_status in ["speaking", "whispering"] and confidence > 0.5:
-            # Check if this is a repeated alert (prevent spam)
-            current_time = datetime.now()
-            client = next((c for c in connected_clients.values() if c.get('exam_id') == exam_id), None)
-            
-            if client:
-                last_alert = client.get('last_audio_alert')
-                alert_cooldown = 20 if audio_status == "whispering" else 30  # Shorter cooldown for whispering
-                
-                if not last_alert or (current_time - last_alert).total_seconds() > alert_cooldown:
-                    
-                    alert_message = ""
-                    alert_type = "warning"
-                    
-                    if audio_status == "whispering":
-                        alert_message = f"🔇 Whispering detected (confidence: {confidence:.1%})"
-                        alert_type = "warning"
-                    elif audio_status == "speaking":
-                        alert_message = f"🗣️ Speaking detected (confidence: {confidence:.1%})"
-                        alert_type = "danger"
-                    
-                    send_proctoring_alert(exam_id, {
-                        "message": alert_message,
-                        "type": alert_type,
-                        "severity": "high" if audio_status == "speaking" else "medium",
-                        "timestamp": current_time.isoformat(),
-                        "studentSocketId": student_id,
-                        "detectionType": "speaking_detected" if audio_status == "speaking" else "audio_detection",
-                        "confidence": confidence
-                    })
-                    
-                    client['last_audio_alert'] = current_time
-                    client['audio_alerts'] = client.get('audio_alerts', 0) + 1
-        
-        return jsonify({
+        response = {
             "audioStatus": audio_status,
             "volume": volume,
             "confidence": confidence,
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        
+        if exam_id and student_id:
+            session = get_student_session(exam_id, student_id)
+            # Per-student rolling volume for trend analysis (kept apart from the streaming buffer)
+            volumes = session.volume_history()
+            volumes.record(volume)
+            response["volumeStats"] = volumes.stats()
+            send_audio_alert(exam_id, student_id, session, audio_status, confidence)
+        
+        return jsonify(response)
         
     except Exception as e:
         print(f"Audio processing error: {e}")
         return jsonify({"error": str(e)}), 500
 
+# ==================== STREAMING AUDIO ====================
+# Students stream raw 16-bit PCM over Socket.IO; each student's ring buffer is analysed in
+# overlapping windows so every sample is decoded and transformed once.
+AUDIO_WINDOW_SECONDS = float(os.environ.get('AUDIO_WINDOW_SECONDS', 1.0))
+AUDIO_HOP_SECONDS = float(os.environ.get('AUDIO_HOP_SECONDS', 0.5))  # 50% overlap by default
+
+audio_streams = {}  # "{exam_id}_{sid}" -> (exam_id, sid, session) for students currently streaming
+_audio_scheduler_started = False
+
+def analyze_audio_stream(exam_id, student_id, session, sample_rate, features):
+    """Per-window decision for a streaming student: record volume and alert"""
+    audio_status, volume, confidence = analyze_audio_enhanced(None, sample_rate, features=features)
+    session.volume_history().record(volume)
+    send_audio_alert(exam_id, student_id, session, audio_status, confidence)
+    return audio_status, confidence
+
+def audio_scheduler_tick():
+    """Collect pending windows from every streaming student and analyse them as one batch per sample rate"""
+    window_sizes = {}
+    batches = defaultdict(list)  # sample_rate -> [(exam_id, sid, session, samples)]
+    for key, (exam_id, student_id, session) in list(audio_streams.items()):
+        stream = session.audio
+        if stream is None:
+            del audio_streams[key]  # Disconnected - per-frame state already freed
+            continue
+        sample_rate = stream.sample_rate
+        if sample_rate not in window_sizes:
+            window_sizes[sample_rate] = (int(sample_rate * AUDIO_WINDOW_SECONDS), max(1, int(sample_rate * AUDIO_HOP_SECONDS)))
+        window, hop = window_sizes[sample_rate]
+        for samples in stream.windows(window, hop):
+            batches[sample_rate].append((exam_id, student_id, session, samples))
+    
+    for sample_rate, entries in batches.items():
+        features = extract_audio_features_batch(np.stack([entry[3] for entry in entries]), sample_rate)
+        for (exam_id, student_id, session, _), window_features in zip(entries, features):
+            if session.audio is not None:
+                analyze_audio_stream(exam_id, student_id, session, sample_rate, window_features)
+    return sum(len(entries) for entries in batches.values())
+
+def audio_scheduler():
+    """Background task that analyses all streaming audio once per hop"""
+    while True:
+        sio.sleep(AUDIO_HOP_SECONDS)
+        try:
+            audio_scheduler_tick()
+        except Exception as e:
+            print(f"Audio scheduler error: {e}")
+
+def start_audio_scheduler():
+    """Start the batched audio scheduler once per process"""
+    global _audio_scheduler_started
+    if not _audio_scheduler_started:
+        _audio_scheduler_started = True
+        sio.start_background_task(audio_scheduler)
+
+@sio.event
+def audio_chunk(sid, data):
+    """Student streams audio: {examId, pcm: <binary payload>, encoding, sampleRate}"""
+    try:
+        exam_id = data.get('examId')
+        pcm = data.get('pcm')
+        encoding = data.get('encoding', 'pcm16')
+        if not exam_id or not pcm:
+            return {"error": "Missing examId or pcm"}
+        # The ring buffer is sized from the sample rate - only accept the supported ones
+        sample_rate = parse_sample_rate(data.get('sampleRate'))
+        if sample_rate is None:
+            return {"error": f"Unsupported sample rate: {data.get('sampleRate')}"}
+        if encoding not in AUDIO_ENCODINGS:
+            return {"error": f"Unsupported audio encoding: {encoding}"}
+        
+        session = get_student_session(exam_id, sid)
+        stream = session.audio_stream(sample_rate)
+        # ADPCM carries predictor state across chunks, so it lives with the stream
+        samples, stream.adpcm_state = decode_audio(pcm, encoding, stream.adpcm_state)
+        stream.write(samples)
+        
+        if _audio_scheduler_started:
+            # Analysed with every other student's windows on the next scheduler tick
+            audio_streams[f"{exam_id}_{sid}"] = (exam_id, sid, session)
+            return {"status": "buffered"}
+        
+        window = int(sample_rate * AUDIO_WINDOW_SECONDS)
+        hop = max(1, int(sample_rate * AUDIO_HOP_SECONDS))
+        audio_status, confidence, windows = "silent", 0.0, 0
+        for samples in stream.windows(window, hop):
+            features = extract_audio_features(samples.tobytes(), sample_rate)
+            status, window_confidence = analyze_audio_stream(exam_id, sid, session, sample_rate, features)
+            if window_confidence >= confidence:
+                audio_status, confidence = status, window_confidence
+            windows += 1
+        
+        return {"audioStatus": audio_status, "confidence": confidence, "windows": windows}
+        
+    except Exception as e:
+        print(f"Audio stream error: {e}")
+        return {"error": str(e)}
+
 # Enhanced main detection endpoint - COMPLETELY UPDATED VERSION
 @app.route('/detect', methods=['POST'])
 def detect():
@@ -1358,18 +1977,45 @@ def detect():
         if not data or 'image' not in data:
             return jsonify({"error": "No image data provided"}), 400
             
-        # ✅ CRITICAL: Extract detection settings from request
-        detection_settings = data.get('detection_settings', {})
         exam_id = data.get('exam_id')
         student_id = data.get('student_id')
         student_socket_id = data.get('student_socket_id')  # Get student socket ID
         
-        print(f"🎯 Received detection from student {student_socket_id} with settings: {detection_settings}")
-        
-        img = decode_image(data['image'])
+        img = decode_image(data['image'], enhance=False)
         if img is None:
             return jsonify({"error": "Invalid image"}), 400
 
+        session = get_student_session(exam_id, student_socket_id or student_id)
+
+        # ✅ CRITICAL: Compiled detection plan - stored via the settings socket events. Once the exam's
+        # versioned settings (with per-student overrides) are applied they win; detection_settings sent
+        # with the frame are only a fallback, compiled once per distinct settings dict
+        applied = connected_clients.get(student_socket_id) or session
+        if 'detection_settings' in data and applied.settings_version is None:
+            plan = compile_detection_plan(data['detection_settings'])
+        else:
+            plan = get_detection_plan(student_socket_id, session)
+
+        # Near-duplicate of the last analysed frame: reuse its result, only advancing the counters
+        thumbnail = frame_thumbnail(img)
+        signature = frame_signature(thumbnail)
+        cached = None if (plan.audio and data.get('audio_data')) else reusable_frame(session, signature, plan)
+        if cached is not None:
+            session.total_frames += 1
+            session.face_detected_count += 1  # Only frames with a face are reused
+            session.detection_history().push(cached.flags, cached.face_count)
+            record_detect_time(start_time)
+            return jsonify({
+                **cached.results,
+                "reused": True,
+                "reuseAge": round(time.time() - cached.analyzed_at, 2),
+                "processingTime": round((time.time() - start_time) * 1000, 2),
+                "sampling": push_sampling_recommendation(session, exam_id, student_socket_id)
+            })
+
+        motion = update_motion(session, thumbnail)
+        raw_img = img  # Unprocessed frame for the screenshot detectors (tuned without CLAHE/sharpening)
+        img = enhance_image_quality(img)
         rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         h, w, _ = img.shape
 
@@ -1380,6 +2026,7 @@ def detect():
             "gaze": "unknown",
             "eyesOpen": True,
             "headPose": "unknown",
+            "headPoseAngles": None,
             "phoneDetected": False,
             "mouseDetected": False,
             "mouthMoving": False,
@@ -1396,6 +2043,7 @@ def detect():
             "attentionScore": 100,
             "detectionConfidence": 0.0,
             "processingTime": 0,
+            "reused": False,
             "enhancedFeatures": {
                 "gazeConfidence": 0.0,
                 "headPoseConfidence": 0.0,
@@ -1409,23 +2057,29 @@ def detect():
             }
         }
 
+        # Structured signal records from every detector; the attention score is computed from these
+        signals = []
+
         # ==================== SCREENSHOT DETECTION ====================
-        results["screenshotDetected"] = False
-        results["screenshotViolations"] = []
-        print("🛑 Screenshot detection disabled globally")
+        # Sampled background stage - a result finished since the last frame is merged here
+        if screenshot_detection_enabled and plan.screenshot:
+            screenshot_result = collect_screenshot_result(session)
+            if screenshot_result and screenshot_result[0]:
+                screenshot_list, screenshot_confidence = screenshot_result
+                results["screenshotDetected"] = True
+                results["screenshotViolations"] = screenshot_list
+                results["enhancedFeatures"]["screenshotConfidence"] = screenshot_confidence
+                results["suspiciousActivities"].append(f"📸 SCREENSHOT: {', '.join(screenshot_list)} (confidence: {screenshot_confidence:.1%})")
+                signals.append(make_signal("screenshot_attempt", screenshot_confidence))
+                
+                send_screenshot_alert(exam_id, student_socket_id, session, screenshot_confidence)
+            
+            schedule_screenshot_check(session, raw_img, exam_id, student_socket_id or student_id)
 
         # ✅ CHECK IF ALL DETECTIONS ARE DISABLED - RETURN EARLY
-        if detection_settings and not any([
-            detection_settings.get('faceDetection', True),
-            detection_settings.get('gazeDetection', True), 
-            detection_settings.get('phoneDetection', True),
-            detection_settings.get('mouthDetection', True),
-            detection_settings.get('multiplePeopleDetection', True),
-            detection_settings.get('audioDetection', True),
-            detection_settings.get('handGestureDetection', True),
-            detection_settings.get('screenshotDetection', True)
-        ]):
+        if not plan.any_stage:
             print("🛑 ALL DETECTIONS DISABLED - Returning minimal response")
+            record_detect_time(start_time)
             return jsonify({
                 "faceDetected": False,
                 "faceCount": 0,
@@ -1443,12 +2097,13 @@ def detect():
                 "attentionScore": 100,
                 "detectionConfidence": 0.0,
                 "processingTime": round((time.time() - start_time) * 1000, 2),
+                "sampling": push_sampling_recommendation(session, exam_id, student_socket_id),
                 "message": "All detections disabled by teacher settings"
             })
 
         # ✅ ONLY PROCESS FACE DETECTION IF ENABLED
         face_results = None
-        if detection_settings.get('faceDetection', True):
+        if plan.face:
             face_results = face_detector.process(rgb_img)
         else:
             # Skip face detection entirely
@@ -1457,24 +2112,28 @@ def detect():
             results["faceCount"] = 0
 
         # If face detection is disabled, skip ALL face-related processing
-        if not detection_settings.get('faceDetection', True):
+        if not plan.face:
             print("🛑 All face-related processing skipped due to settings")
             results["processingTime"] = round((time.time() - start_time) * 1000, 2)
+            record_detect_time(start_time)
+            results["sampling"] = push_sampling_recommendation(session, exam_id, student_socket_id)
             return jsonify(results)
 
         # Continue with face detection if enabled
         if face_results and face_results.detections:
             results["faceCount"] = len(face_results.detections)
             results["faceDetected"] = True
+            faces = analyze_faces(face_boxes_to_array(face_results))
 
             # ✅ ONLY DO MULTIPLE PEOPLE DETECTION IF ENABLED
-            if detection_settings.get('multiplePeopleDetection', True):
-                multiple_people, multiple_confidence = detect_multiple_people_enhanced(face_results, img, w, h)
+            if plan.multiple_people:
+                multiple_people, multiple_confidence = detect_multiple_people_enhanced(faces)
                 results["multiplePeople"] = multiple_people
                 results["enhancedFeatures"]["multiplePeopleConfidence"] = multiple_confidence
                 
                 if multiple_people and multiple_confidence > 0.5:
                     results["suspiciousActivities"].append(f"👥 MULTIPLE PEOPLE DETECTED ({results['faceCount']} faces, confidence: {multiple_confidence:.1%})")
+                    signals.append(make_signal("multiple_people", multiple_confidence))
                     
                     if exam_id and multiple_confidence > 0.6:
                         send_proctoring_alert(exam_id, {
@@ -1509,26 +2168,36 @@ def detect():
             
             cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
-            # ✅ ENHANCED FACE MESH - ONLY IF FACE DETECTION ENABLED
-            mesh_results = face_mesh.process(rgb_img)
-            if mesh_results.multi_face_landmarks:
-                landmarks = mesh_results.multi_face_landmarks[0]
+            # ✅ ENHANCED FACE MESH - ONLY IF FACE DETECTION ENABLED (and the face region moved)
+            face_motion = motion_fraction(motion, x1 / w, y1 / h, x2 / w, y2 / h, margin=0.2)
+            run_mesh = stage_due(session, 'mesh', plan, face_motion)
+            mesh_start = (len(results["suspiciousActivities"]), len(signals))
+            mesh_results = face_mesh.process(rgb_img) if run_mesh else None
+            if mesh_results is not None and mesh_results.multi_face_landmarks:
+                # Convert every detected face mesh to arrays once; the first face drives the analysis
+                face_arrays = stack_landmarks(mesh_results.multi_face_landmarks, 478)
+                face_points = face_arrays[0]
                 results["eyeDetected"] = True
                 
                 # ✅ ONLY DO GAZE DETECTION IF ENABLED
-                if detection_settings.get('gazeDetection', True):
-                    gaze_direction, eyes_open, is_blinking, gaze_confidence = get_gaze_direction_enhanced(landmarks, w, h)
+                if plan.gaze:
+                    gaze_direction, eyes_open, is_blinking, gaze_confidence = get_gaze_direction_enhanced(face_points, w, h)
                     results["gaze"] = gaze_direction
                     results["eyesOpen"] = eyes_open
                     results["blinking"] = is_blinking
                     results["gazeForward"] = (gaze_direction == "forward")
                     results["enhancedFeatures"]["gazeConfidence"] = abs(gaze_confidence)
                     
-                    # Enhanced gaze monitoring - ONLY IF ENABLED
-                    if gaze_direction != "forward" and abs(gaze_confidence) > 0.03:
-                        results["suspiciousActivities"].append(f"👀 GAZE DEVIATION: {gaze_direction} (confidence: {abs(gaze_confidence):.3f})")
+                    # Enhanced gaze monitoring - smoothed so only sustained sideways looks count
+                    sideways = any(direction in gaze_direction for direction in ["left", "right"])
+                    gaze_value, gaze_active, gaze_fired = get_signal_smoother(session).update(
+                        SMOOTH_GAZE, abs(gaze_confidence) if sideways else 0.0
+                    )
+                    if gaze_active:
+                        results["suspiciousActivities"].append(f"👀 GAZE DEVIATION: {gaze_direction} (confidence: {gaze_value:.3f})")
+                        signals.append(make_signal("gaze_deviation", gaze_value))
                         
-                        if exam_id and any(direction in gaze_direction for direction in ["left", "right"]) and abs(gaze_confidence) > 0.05:
+                        if exam_id and gaze_fired:
                             send_proctoring_alert(exam_id, {
                                 "message": f"👀 Eye movement detected: {gaze_direction}",
                                 "type": "warning",
@@ -1536,24 +2205,30 @@ def detect():
                                 "timestamp": datetime.now().isoformat(),
                                 "studentSocketId": student_socket_id,
                                 "detectionType": "gaze_deviation",
-                                "confidence": abs(gaze_confidence)
+                                "confidence": gaze_value
                             })
                 else:
                     print("🛑 Gaze detection disabled")
+                    get_signal_smoother(session).reset(SMOOTH_GAZE)
                     results["gaze"] = "disabled"
                     results["eyesOpen"] = True
                     results["blinking"] = False
 
                 # ✅ ONLY DO HEAD POSE DETECTION IF ENABLED
-                if detection_settings.get('gazeDetection', True):  # Head pose usually tied to gaze
-                    head_pose, head_pose_confidence = detect_head_pose_enhanced(landmarks, w, h)
+                if plan.head_pose:
+                    head_pose, head_pose_confidence, head_pose_angles = detect_head_pose_enhanced(face_points, w, h, session)
                     results["headPose"] = head_pose
+                    results["headPoseAngles"] = head_pose_angles
                     results["enhancedFeatures"]["headPoseConfidence"] = head_pose_confidence
                     
-                    if head_pose != "head forward" and head_pose_confidence > 0.5:
-                        results["suspiciousActivities"].append(f"🙄 HEAD POSE: {head_pose} (confidence: {head_pose_confidence:.1%})")
+                    head_value, head_active, head_fired = get_signal_smoother(session).update(
+                        SMOOTH_HEAD_POSE, head_pose_confidence if head_pose != "head forward" else 0.0
+                    )
+                    if head_active:
+                        results["suspiciousActivities"].append(f"🙄 HEAD POSE: {head_pose} (confidence: {head_value:.1%})")
+                        signals.append(make_signal("head_pose_deviation", head_value))
                         
-                        if exam_id and head_pose_confidence > 0.6:
+                        if exam_id and head_fired:
                             send_proctoring_alert(exam_id, {
                                 "message": f"🙄 Head movement: {head_pose}",
                                 "type": "warning", 
@@ -1561,22 +2236,27 @@ def detect():
                                 "timestamp": datetime.now().isoformat(),
                                 "studentSocketId": student_socket_id,
                                 "detectionType": "head_pose_deviation",
-                                "confidence": head_pose_confidence
+                                "confidence": head_value
                             })
                 else:
                     print("🛑 Head pose detection disabled")
+                    get_signal_smoother(session).reset(SMOOTH_HEAD_POSE)
                     results["headPose"] = "disabled"
 
                 # ✅ ONLY DO MOUTH MOVEMENT DETECTION IF ENABLED
-                if detection_settings.get('mouthDetection', True):
-                    is_talking, mouth_openness, mouth_confidence = detect_mouth_movement_enhanced(landmarks)
+                if plan.mouth:
+                    is_talking, mouth_openness, mouth_confidence = detect_mouth_movement_enhanced(face_points)
                     results["mouthMoving"] = is_talking
                     results["enhancedFeatures"]["mouthMovementConfidence"] = mouth_confidence / 4.0  # Normalize to 0-1
                     
-                    if is_talking and mouth_confidence >= 2:
-                        results["suspiciousActivities"].append(f"🗣️ MOUTH MOVEMENT: Possible talking (confidence: {mouth_confidence}/4)")
+                    mouth_value, mouth_active, mouth_fired = get_signal_smoother(session).update(
+                        SMOOTH_MOUTH, mouth_confidence / 4.0 if is_talking else 0.0
+                    )
+                    if mouth_active:
+                        results["suspiciousActivities"].append(f"🗣️ MOUTH MOVEMENT: Possible talking (confidence: {mouth_value:.1%})")
+                        signals.append(make_signal("mouth_movement", mouth_value))
                         
-                        if exam_id and mouth_confidence >= 3:
+                        if exam_id and mouth_fired:
                             send_proctoring_alert(exam_id, {
                                 "message": "🗣️ Suspicious mouth movement detected - Possible communication",
                                 "type": "warning",
@@ -1584,28 +2264,42 @@ def detect():
                                 "timestamp": datetime.now().isoformat(),
                                 "studentSocketId": student_socket_id,
                                 "detectionType": "mouth_movement",
-                                "confidence": mouth_confidence / 4.0
+                                "confidence": mouth_value
                             })
                 else:
                     print("🛑 Mouth detection disabled")
+                    get_signal_smoother(session).reset(SMOOTH_MOUTH)
                     results["mouthMoving"] = False
 
-            # ✅ ONLY DO HAND DETECTION FOR PHONE/MOUSE IF ENABLED
+            if run_mesh:
+                remember_stage(session, 'mesh', plan, results, signals, mesh_start)
+            else:
+                replay_stage(session, 'mesh', results, signals)
+
+            # ✅ ONLY DO HAND DETECTION FOR PHONE/MOUSE IF ENABLED (and the lower half of the frame moved)
             hand_results = None
-            if detection_settings.get('phoneDetection', True) or detection_settings.get('handGestureDetection', True):
+            run_hands = plan.hands_pose and stage_due(session, 'hands', plan, motion_fraction(motion, 0.0, 0.5, 1.0, 1.0))
+            hands_start = (len(results["suspiciousActivities"]), len(signals))
+            if plan.hands_pose and not run_hands:
+                replay_stage(session, 'hands', results, signals)
+            if run_hands:
                 hand_results = hand_detector.process(rgb_img)
                 pose_results = pose_detector.process(rgb_img)
+                hand_points = stack_landmarks(hand_results.multi_hand_landmarks, 21)
+                pose_points = pose_to_array(pose_results)
+                hands = analyze_hands(hand_points, faces["centers"])
                 
                 
 
                 # ✅ ONLY DO MOUSE DETECTION IF ENABLED (usually tied to phone detection)
-                if detection_settings.get('phoneDetection', True):
-                    mouse_detected, mouse_confidence = detect_mouse_usage_enhanced(hand_results, pose_results, w, h)
+                if plan.phone:
+                    mouse_detected, mouse_confidence = detect_mouse_usage_enhanced(hands, pose_points, w, h)
                     results["mouseDetected"] = mouse_detected
                     results["enhancedFeatures"]["mouseConfidence"] = mouse_confidence
                     
                     if mouse_detected and mouse_confidence > 0.6:
                         results["suspiciousActivities"].append(f"🖱️ POTENTIAL MOUSE USAGE (confidence: {mouse_confidence:.1%})")
+                        signals.append(make_signal("mouse_usage", mouse_confidence))
                         
                         if exam_id and mouse_confidence > 0.7:
                             send_proctoring_alert(exam_id, {
@@ -1622,16 +2316,13 @@ def detect():
                     results["mouseDetected"] = False
 
                 # ✅ HAND GESTURE DETECTION
-                if detection_settings.get('handGestureDetection', True) and hand_results and hand_results.multi_hand_landmarks:
-                    hand_violations, hand_confidence = detect_suspicious_gestures(
-                        hand_results.multi_hand_landmarks, 
-                        face_center_x, 
-                        face_center_y
-                    )
+                if plan.hand_gesture and hands["count"]:
+                    hand_violations, hand_confidence = detect_suspicious_gestures(hands)
                     
                     for violation in hand_violations:
                         if hand_confidence > 0.5:
                             results["suspiciousActivities"].append(f"🤚 GESTURE: {violation} (confidence: {hand_confidence:.1%})")
+                            signals.append(make_signal("suspicious_gesture", hand_confidence))
                             results["enhancedFeatures"]["handGestureConfidence"] = hand_confidence
                             
                             if exam_id and hand_confidence > 0.6:
@@ -1644,46 +2335,66 @@ def detect():
                                     "detectionType": "suspicious_gesture",
                                     "confidence": hand_confidence
                                 })
+                
+                remember_stage(session, 'hands', plan, results, signals, hands_start)
 
-        else:
-            # Only show no face alert if face detection is enabled AND no face detected in multiple frames
-            if detection_settings.get('faceDetection', True):
-                # Check detection history to avoid false positives
-                current_time = datetime.now()
-                recent_no_face_count = sum(1 for detection in list(detection_history)[-5:] 
-                                          if not detection.get('faceDetected', False))
-        
-                if recent_no_face_count >= 3:  # Only alert if no face for 3 consecutive frames
-                    results["suspiciousActivities"].append("❌ NO FACE: Face not visible in camera")
-            
-                    if exam_id:
-                        send_proctoring_alert(exam_id, {
-                            "message": "❌ Face not visible - Please adjust camera position",
-                            "type": "warning",
-                            "severity": "high",
-                            "timestamp": datetime.now().isoformat(),
-                            "studentSocketId": student_socket_id,
-                            "detectionType": "no_face_detected"
-                        })
-        
-            # Store current detection in history
-            detection_history.append({
-                'timestamp': current_time,
-                'faceDetected': False,
-                'faceCount': 0
-            })
+        # Record this frame in the student's own history before evaluating temporal rules
+        frame_flags = 0
+        if results["faceDetected"]:
+            frame_flags |= FLAG_FACE
+        if results["multiplePeople"]:
+            frame_flags |= FLAG_MULTIPLE_PEOPLE
+        if not results["gazeForward"]:
+            frame_flags |= FLAG_GAZE_AWAY
+        if results["headPose"] not in ("head forward", "unknown", "disabled"):
+            frame_flags |= FLAG_HEAD_TURNED
+        if results["mouthMoving"]:
+            frame_flags |= FLAG_MOUTH_MOVING
+        if results["suspiciousActivities"]:
+            frame_flags |= FLAG_SUSPICIOUS
+
+        session.total_frames += 1
+        if results["faceDetected"]:
+            session.face_detected_count += 1
+        history = session.detection_history()
+        history.push(frame_flags, results["faceCount"])
+
+        # Only show no face alert if no face was detected in 3 of this student's last 5 frames
+        if not results["faceDetected"] and history.count_recent(FLAG_FACE, 5, present=False) >= 3:
+            results["suspiciousActivities"].append("❌ NO FACE: Face not visible in camera")
+            signals.append(make_signal("no_face_detected", 1.0))
+
+            if exam_id:
+                send_proctoring_alert(exam_id, {
+                    "message": "❌ Face not visible - Please adjust camera position",
+                    "type": "warning",
+                    "severity": "high",
+                    "timestamp": datetime.now().isoformat(),
+                    "studentSocketId": student_socket_id,
+                    "detectionType": "no_face_detected"
+                })
 
         # ✅ AUDIO DETECTION
-        if detection_settings.get('audioDetection', True):
+        if plan.audio:
             # Process audio if available
             audio_data = data.get('audio_data')
-            if audio_data:
-                audio_violations, audio_confidence = detect_audio_violations(audio_data)
+            audio_sample_rate = parse_sample_rate(data.get('audio_sample_rate'))
+            if audio_data and audio_sample_rate is None:
+                print(f"Unsupported audio sample rate: {data.get('audio_sample_rate')} - skipping audio")
+            elif audio_data:
+                # audio_data arrives base64-encoded in the JSON body
+                try:
+                    audio_samples = decode_audio_base64(audio_data, data.get('audio_encoding', 'pcm16'))
+                except Exception as e:
+                    print(f"Audio decode error: {e}")
+                    audio_samples = None
+                audio_violations, audio_confidence = detect_audio_violations(audio_samples, audio_sample_rate)
                 results["enhancedFeatures"]["audioConfidence"] = audio_confidence
                 
                 for violation in audio_violations:
                     if audio_confidence > 0.5:
                         results["suspiciousActivities"].append(f"🎤 AUDIO: {violation} (confidence: {audio_confidence:.1%})")
+                        signals.append(make_signal("audio_detection", audio_confidence))
                         
                         if exam_id and audio_confidence > 0.6:
                             send_proctoring_alert(exam_id, {
@@ -1699,34 +2410,14 @@ def detect():
         # ✅ ENHANCED attention score calculation - ONLY COUNT ENABLED DETECTIONS
         violation_count = len(results["suspiciousActivities"])
         
-        # Calculate weighted penalty based on confidence - ONLY FOR ENABLED DETECTIONS
-        confidence_penalty = 0
-        for activity in results["suspiciousActivities"]:
-            if "confidence:" in activity:
-                try:
-                    # Extract confidence from activity string
-                    conf_str = activity.split("confidence:")[1].split(")")[0].split("%")[0]
-                    if "/" in conf_str:
-                        # Handle fraction-based confidence (e.g., "2/4")
-                        parts = conf_str.split("/")
-                        if len(parts) == 2:
-                            confidence_val = float(parts[0]) / float(parts[1])
-                    else:
-                        confidence_val = float(conf_str.strip().rstrip('%')) / 100.0
-                    
-                    confidence_penalty += min(25, 20 * confidence_val)
-                except:
-                    confidence_penalty += 15  # Default penalty
-        
-        results["attentionScore"] = max(0, 100 - confidence_penalty)
+        results["attentionScore"] = calculate_attention_score(signals)
+        if exam_id:
+            exam_status.update(exam_id, student_socket_id or student_id, attentionScore=results["attentionScore"])
         results["detectionConfidence"] = calculate_overall_confidence(results)
+        results["signals"] = [signal._asdict() for signal in signals]
         
         # Only send low attention alert if relevant detections are enabled
-        if exam_id and results["attentionScore"] < 70 and any([
-            detection_settings.get('gazeDetection', True),
-            detection_settings.get('phoneDetection', True),
-            detection_settings.get('multiplePeopleDetection', True),
-        ]):
+        if exam_id and results["attentionScore"] < plan.attention_threshold and plan.attention_alert:
             send_proctoring_alert(exam_id, {
                 "message": f"📉 Low attention score: {results['attentionScore']}% - High distraction level",
                 "type": "danger",
@@ -1739,7 +2430,7 @@ def detect():
 
         # Enhanced debug image with settings information
         try:
-            settings_status = f"Settings: Face:{detection_settings.get('faceDetection',True)} Gaze:{detection_settings.get('gazeDetection',True)} Screenshot:{detection_settings.get('screenshotDetection',True)}"
+            settings_status = f"Settings: Face:{plan.face} Gaze:{plan.gaze} Screenshot:{plan.screenshot}"
             status_text = f"Faces: {results['faceCount']} | Gaze: {results['gaze']} | Screenshot: {results['screenshotDetected']}"
             confidence_text = f"Overall Confidence: {results['detectionConfidence']:.1%}"
             score_text = f"Attention: {results['attentionScore']}% | Alerts: {violation_count}"
@@ -1772,6 +2463,9 @@ def detect():
 
         # Calculate processing time
         results["processingTime"] = round((time.time() - start_time) * 1000, 2)
+        session.last_frame = AnalyzedFrame(signature, reusable_results(results, signals), frame_flags, results["faceCount"], plan, time.time())
+        record_detect_time(start_time)
+        results["sampling"] = push_sampling_recommendation(session, exam_id, student_socket_id)
 
         print(f"✅ Detection completed for student {student_socket_id} - Screenshot: {results['screenshotDetected']}, Alerts: {len(results['suspiciousActivities'])}")
         return jsonify(results)
@@ -1780,31 +2474,283 @@ def detect():
         print(f"Detection error: {e}")
         return jsonify({"error": str(e), "message": "Internal server error occurred"}), 500
 
+# ==================== NEAR-DUPLICATE FRAME GATING ====================
+# A student sitting still sends nearly identical frames; if a frame's 32x24 grayscale thumbnail is
+# within FRAME_REUSE_THRESHOLD gray levels (mean absolute difference) of the last analysed frame,
+# that frame's result is reused. FRAME_REUSE_MAX_AGE forces a full analysis every so often, and
+# frames without a face are never reused so the no-face rule and its alert run on every one of them.
+# The cached copy drops the debug image and the screenshot result merged into that frame, so memory
+# per idle session stays small and a one-shot screenshot alert is not reported again.
+FRAME_REUSE_THRESHOLD = float(os.environ.get('FRAME_REUSE_THRESHOLD', 3.0))
+FRAME_REUSE_MAX_AGE = float(os.environ.get('FRAME_REUSE_MAX_AGE', 20))
+
+def frame_thumbnail(img):
+    """64x48 grayscale thumbnail shared by the reuse gate and the motion stage"""
+    return cv2.cvtColor(cv2.resize(img, MOTION_GRID, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+def frame_signature(thumbnail):
+    """32x24 near-duplicate signature of a frame thumbnail"""
+    return cv2.resize(thumbnail, (32, 24), interpolation=cv2.INTER_AREA)
+
+def reusable_results(results, signals):
+    """Trimmed copy of a frame's results to serve again: no debug image and no one-shot screenshot result"""
+    kept = [signal for signal in signals if signal.type != "screenshot_attempt"]
+    trimmed = {
+        **results,
+        "debugImage": None,
+        "screenshotDetected": False,
+        "screenshotViolations": [],
+        "suspiciousActivities": [activity for activity in results["suspiciousActivities"] if not activity.startswith("📸 SCREENSHOT")],
+        "enhancedFeatures": {**results["enhancedFeatures"], "screenshotConfidence": 0.0},
+        "signals": [signal._asdict() for signal in kept],
+        "attentionScore": calculate_attention_score(kept)
+    }
+    trimmed["detectionConfidence"] = calculate_overall_confidence(trimmed)
+    return trimmed
+
+def reusable_frame(session, signature, plan, now=None):
+    """The student's last AnalyzedFrame if this frame is a near-duplicate of it, else None"""
+    cached = session.last_frame
+    now = time.time() if now is None else now
+    if cached is None or cached.plan is not plan or now - cached.analyzed_at > FRAME_REUSE_MAX_AGE:
+        return None
+    if not cached.results["faceDetected"]:
+        return None
+    if cv2.norm(signature, cached.signature, cv2.NORM_L1) / signature.size > FRAME_REUSE_THRESHOLD:
+        return None
+    return cached
+
+# ==================== MOTION-GATED STAGES ====================
+# Each student keeps a low-res EWMA background. Face mesh runs only when the face region moved and
+# hands/pose only when the lower half of the frame moved; otherwise the stage's last output is
+# replayed. MOTION_MAX_SKIP_AGE forces a stage to run again every so often.
+MOTION_GRID = (64, 48)
+MOTION_PIXEL_THRESHOLD = float(os.environ.get('MOTION_PIXEL_THRESHOLD', 12))  # Gray levels
+MOTION_TRIGGER_FRACTION = float(os.environ.get('MOTION_TRIGGER_FRACTION', 0.02))
+MOTION_BACKGROUND_ALPHA = 0.3
+MOTION_MAX_SKIP_AGE = float(os.environ.get('MOTION_MAX_SKIP_AGE', 15))
+
+# Result fields and feature confidences each gated stage owns
+STAGE_FIELDS = {
+    'mesh': ("eyeDetected", "gaze", "eyesOpen", "blinking", "gazeForward", "headPose", "headPoseAngles", "mouthMoving"),
+    'hands': ("mouseDetected",)
+}
+STAGE_FEATURES = {
+    'mesh': ("gazeConfidence", "headPoseConfidence", "mouthMovementConfidence"),
+    'hands': ("mouseConfidence", "handGestureConfidence")
+}
+
+def update_motion(session, thumbnail):
+    """Boolean motion mask of a thumbnail against the student's background, then update the background"""
+    frame = thumbnail.astype(np.float32)
+    background = session.motion_background
+    if background is None:
+        session.motion_background = frame
+        return np.ones(frame.shape, dtype=bool)  # No background yet - everything counts as motion
+    mask = cv2.absdiff(frame, background) > MOTION_PIXEL_THRESHOLD
+    cv2.accumulateWeighted(frame, background, MOTION_BACKGROUND_ALPHA)
+    return mask
+
+def motion_fraction(mask, x1, y1, x2, y2, margin=0.0):
+    """Fraction of moving cells in a normalized box (optionally grown by `margin` of its size)"""
+    rows, cols = mask.shape
+    dx, dy = (x2 - x1) * margin, (y2 - y1) * margin
+    r1, r2 = max(0, int((y1 - dy) * rows)), min(rows, int(np.ceil((y2 + dy) * rows)))
+    c1, c2 = max(0, int((x1 - dx) * cols)), min(cols, int(np.ceil((x2 + dx) * cols)))
+    region = mask[r1:r2, c1:c2]
+    return float(region.mean()) if region.size else 0.0
+
+def stage_due(session, stage, plan, motion, now=None):
+    """Whether a gated stage has to run on this frame"""
+    output = session.stage_outputs.get(stage)
+    now = time.time() if now is None else now
+    return (output is None or output.plan is not plan or now - output.produced_at > MOTION_MAX_SKIP_AGE
+            or motion >= MOTION_TRIGGER_FRACTION)
+
+def remember_stage(session, stage, plan, results, signals, start):
+    """Record what a stage added to this frame's results"""
+    session.stage_outputs[stage] = StageOutput(
+        {field: results[field] for field in STAGE_FIELDS[stage]},
+        {feature: results["enhancedFeatures"][feature] for feature in STAGE_FEATURES[stage]},
+        results["suspiciousActivities"][start[0]:], signals[start[1]:], plan, time.time()
+    )
+
+def replay_stage(session, stage, results, signals):
+    """Re-apply a skipped stage's last output (no alerts, no smoother updates)"""
+    output = session.stage_outputs.get(stage)
+    if output is None:
+        return
+    results.update(output.fields)
+    results["enhancedFeatures"].update(output.features)
+    results["suspiciousActivities"].extend(output.activities)
+    signals.extend(output.signals)
+    results.setdefault("skippedStages", []).append(stage)
+
+# ==================== ADAPTIVE FRAME SAMPLING ====================
+# The server recommends each student's capture interval and resolution. Students with recent
+# suspicious frames or few attempts left are sampled faster and clean students slower. Everyone
+# backs off once /detect is busier than SAMPLING_LOAD_TARGET (fraction of wall time spent analysing
+# frames), and teachers can scale an exam's intervals to trade coverage for capacity.
+SAMPLING_MIN_INTERVAL_MS = int(os.environ.get('SAMPLING_MIN_INTERVAL_MS', 2000))
+SAMPLING_MAX_INTERVAL_MS = int(os.environ.get('SAMPLING_MAX_INTERVAL_MS', 10000))
+SAMPLING_CEILING_MS = int(os.environ.get('SAMPLING_CEILING_MS', 30000))  # Hard cap once overloaded
+SAMPLING_LOAD_TARGET = float(os.environ.get('SAMPLING_LOAD_TARGET', 0.7))
+SAMPLING_LOAD_WINDOW = 10  # Seconds of /detect busy time behind the load estimate
+SAMPLING_STEP_MS = 500  # Intervals are rounded so small load changes don't cause a push every frame
+SAMPLING_SCALE_RANGE = (0.5, 4.0)
+
+detect_busy_ms = BucketedCounter(1, SAMPLING_LOAD_WINDOW + 2)  # Milliseconds spent in /detect, per second
+exam_sampling_scale = {}  # exam_id -> teacher interval multiplier
+
+def record_detect_time(start, now=None):
+    """Add one /detect call's processing time to the load estimate"""
+    now = time.time() if now is None else now
+    detect_busy_ms.add(now, int((now - start) * 1000))
+
+def detect_load(now=None):
+    """Fraction of the last SAMPLING_LOAD_WINDOW seconds spent inside /detect"""
+    return detect_busy_ms.count_since(SAMPLING_LOAD_WINDOW, now) / (SAMPLING_LOAD_WINDOW * 1000.0)
+
+def sampling_risk(session):
+    """0 (clean, attempts intact) .. 1 (every recent frame suspicious or out of attempts)"""
+    suspicion = 0.0
+    if session.history is not None and len(session.history):
+        n = min(10, len(session.history))
+        suspicion = session.history.count_recent(FLAG_SUSPICIOUS, n) / n
+    used = 1.0 - session.attempts_left / session.max_attempts if session.max_attempts else 0.0
+    return min(1.0, max(suspicion, used, 0.0))
+
+def recommend_sampling(session, exam_id, now=None):
+    """Capture interval, width and JPEG quality for a student's next frames"""
+    risk = sampling_risk(session)
+    pressure = detect_load(now) / SAMPLING_LOAD_TARGET
+    # Geometric between the bounds: risk 0 -> max interval, risk 1 -> min interval
+    interval = SAMPLING_MAX_INTERVAL_MS * (SAMPLING_MIN_INTERVAL_MS / SAMPLING_MAX_INTERVAL_MS) ** risk
+    interval *= max(1.0, pressure) * exam_sampling_scale.get(exam_id, 1.0)
+    interval = int(round(interval / SAMPLING_STEP_MS) * SAMPLING_STEP_MS)
+    interval = min(SAMPLING_CEILING_MS, max(SAMPLING_MIN_INTERVAL_MS, interval))
+
+    # Over capacity, low-risk students also send smaller frames; suspicious ones keep full resolution
+    if pressure <= 1.0 or risk >= 0.5:
+        return SamplingPlan(interval, 640, 0.8)
+    if pressure <= 2.0:
+        return SamplingPlan(interval, 480, 0.7)
+    return SamplingPlan(interval, 320, 0.6)
+
+def push_sampling_recommendation(session, exam_id, student_socket_id):
+    """Recompute a student's sampling plan and push it to their socket when it changes"""
+    sampling = recommend_sampling(session, exam_id)
+    if sampling != session.sampling and student_socket_id in connected_clients:
+        sio.emit('sampling-recommendation', {
+            'examId': exam_id,
+            'intervalMs': sampling.interval_ms,
+            'width': sampling.width,
+            'quality': sampling.quality
+        }, room=student_socket_id)
+    session.sampling = sampling
+    return {'intervalMs': sampling.interval_ms, 'width': sampling.width, 'quality': sampling.quality}
+
+@sio.event
+def set_sampling_scale(sid, data):
+    """Teacher scales an exam's capture intervals (>1 saves server capacity, <1 samples more often)"""
+    exam_id = data.get('examId')
+    if not exam_id:
+        return {"error": "Missing examId"}
+    try:
+        scale = float(data.get('scale', 1.0))
+    except (TypeError, ValueError):
+        return {"error": "Invalid scale"}
+    low, high = SAMPLING_SCALE_RANGE
+    scale = min(high, max(low, scale))
+    exam_sampling_scale[exam_id] = scale
+    # Students pick the new interval up with the recommendation on their next frame
+    return {"status": "sampling_scale_updated", "scale": scale, "load": round(detect_load(), 3)}
+
 def calculate_overall_confidence(results):
     """Calculate overall detection confidence"""
     try:
-        confidences = []
+        # Face detection confidence plus every non-zero feature confidence
+        features = np.fromiter(results["enhancedFeatures"].values(), dtype=np.float64)
+        face_confidence = 0.8 if results["faceDetected"] else 0.2
+        total = face_confidence + features[features > 0].sum()
+        return float(total / (1 + np.count_nonzero(features > 0)))
+            
+    except Exception as e:
+        print(f"Confidence calculation error: {e}")
+        return 0.5
+
+@app.route('/detect-screen', methods=['POST'])
+def detect_screen():
+    """Screen-share frame: diff tiles against the last analysed frame and queue only changed regions"""
+    try:
+        start_time = time.time()
+        data = request.json
+        if not data or 'image' not in data:
+            return jsonify({"error": "No image data provided"}), 400
         
-        # Face detection confidence
-        if results["faceDetected"]:
-            confidences.append(0.8)
-        else:
-            confidences.append(0.2)
+        exam_id = data.get('exam_id')
+        student_socket_id = data.get('student_socket_id') or data.get('student_id')
+        if not exam_id or not student_socket_id:
+            return jsonify({"error": "Missing exam_id or student_socket_id"}), 400
+        session = get_student_session(exam_id, student_socket_id)
         
-        # Add feature confidences
-        for feature, confidence in results["enhancedFeatures"].items():
-            if confidence > 0:
-                confidences.append(confidence)
+        results = {
+            "screenshotDetected": False,
+            "screenshotViolations": [],
+            "screenshotConfidence": 0.0,
+            "dirtyTiles": 0,
+            "totalTiles": 0,
+            "analysisQueued": False
+        }
         
-        # Calculate weighted average
-        if confidences:
-            return sum(confidences) / len(confidences)
-        else:
-            return 0.5  # Default medium confidence
+        if not screenshot_detection_enabled or not get_detection_plan(student_socket_id, session).screenshot:
+            return jsonify({**results, "message": "Screenshot detection disabled"})
+        
+        # Merge the analysis queued by an earlier frame
+        job = session.screen_job
+        if job is not None and job.done():
+            session.screen_job = None
+            screenshot_list, screenshot_confidence = job.result()
+            if screenshot_list:
+                results["screenshotDetected"] = True
+                results["screenshotViolations"] = screenshot_list
+                results["screenshotConfidence"] = screenshot_confidence
+                send_screenshot_alert(exam_id, student_socket_id, session, screenshot_confidence, "Screenshot activity on shared screen")
+        
+        # While an analysis is in flight the stored signatures stay at the last analysed frame,
+        # so tiles changed in between are still dirty on the next frame
+        if session.screen_job is None:
+            image_data = data['image'].split(',')[1] if "," in data['image'] else data['image']
+            img = cv2.imdecode(np.frombuffer(base64.b64decode(image_data), np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                return jsonify({"error": "Invalid image"}), 400
+            
+            signatures = screen_tile_signatures(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+            previous = session.screen_tiles
+            if previous is None or previous.shape != signatures.shape:
+                dirty = np.ones(signatures.shape[:2], dtype=bool)  # First frame or resolution change
+            else:
+                dirty = (signatures != previous).any(axis=2)
+            results["dirtyTiles"] = int(np.count_nonzero(dirty))
+            results["totalTiles"] = int(dirty.size)
             
+            if results["dirtyTiles"] and screenshot_slots.acquire(blocking=False):
+                try:
+                    session.screen_job = screenshot_executor.submit(
+                        analyze_screen_regions, img, dirty_screen_regions(dirty, img.shape), exam_id, student_socket_id
+                    )
+                except Exception:
+                    screenshot_slots.release()
+                    raise
+                session.screen_tiles = signatures
+                results["analysisQueued"] = True
+        
+        results["processingTime"] = round((time.time() - start_time) * 1000, 2)
+        return jsonify(results)
+        
     except Exception as e:
-        print(f"Confidence calculation error: {e}")
-        return 0.5
+        print(f"Screen detection error: {e}")
+        return jsonify({"error": str(e)}), 500
 
 # ILAGAY BEFORE NG @app.route('/health')
 
@@ -1815,14 +2761,13 @@ def get_all_tab_switches(exam_id):
     """Get tab switch statistics for all students in exam"""
     try:
         exam_switches = {}
-        for key in tab_switch_tracker.keys():
-            if exam_id in key:
-                student_socket_id = key.split('_')[-1]
-                tracker = tab_switch_tracker[key]
-                exam_switches[student_socket_id] = {
-                    "total_switches": tracker['count'],
-                    "last_switch_time": tracker['last_switch_time'],
-                    "recent_count": len([h for h in tracker['history'] if is_recent(h.get('timestamp'))])
+        for session in list(student_sessions.values()):
+            if str(session.exam_id) == exam_id and session.tab_history:
+                exam_switches[session.sid] = {
+                    "total_switches": session.tab_switch_count,
+                    "last_switch_time": session.last_switch_time,
+                    "recent_count": session.recent_tab_switches(5 * 60),
+                    "last_24h_count": session.recent_tab_switches(24 * 3600)
                 }
         
         return jsonify({
@@ -1834,47 +2779,37 @@ def get_all_tab_switches(exam_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/exam-status/<exam_id>', methods=['GET'])
+def get_exam_status_snapshot(exam_id):
+    """Attempts, tab switches, last alert and attention score for every student (?since=<version> for deltas)"""
+    try:
+        since = request.args.get('since', type=int)
+        return jsonify({**exam_status.snapshot(exam_id, since), "timestamp": datetime.now().isoformat()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # ✅ DAGDAG MO ITO - INDIVIDUAL STUDENT ENDPOINT
 @app.route('/tab-switches/<exam_id>/<student_socket_id>', methods=['GET'])
 def get_tab_switches(exam_id, student_socket_id):
     """Get tab switch statistics for a specific student"""
     try:
-        key = f"{exam_id}_{student_socket_id}"
-        tracker = tab_switch_tracker.get(key, {
-            'count': 0,
-            'last_switch_time': None,
-            'history': []
-        })
+        session = find_student_session(exam_id, student_socket_id)
+        if session is None:
+            session = StudentSession(student_socket_id, exam_id)
         
         return jsonify({
             "exam_id": exam_id,
             "student_socket_id": student_socket_id,
-            "total_switches": tracker['count'],
-            "last_switch_time": tracker['last_switch_time'],
-            "recent_history": tracker['history'][-10:],
+            "total_switches": session.tab_switch_count,
+            "last_switch_time": session.last_switch_time,
+            "recent_count": session.recent_tab_switches(5 * 60),
+            "last_24h_count": session.recent_tab_switches(24 * 3600),
+            "recent_history": session.tab_switch_snapshot(last=10),
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def is_recent(timestamp_str, minutes=5):
-    """Check if timestamp is within the last specified minutes"""
-    try:
-        if not timestamp_str:
-            return False
-        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        return (datetime.now() - timestamp).total_seconds() < minutes * 60
-    except:
-        return False
-        
-def is_recent_24h(timestamp_str):
-    """Check if timestamp is within the last 24 hours"""
-    try:
-        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        return (datetime.now() - timestamp).total_seconds() < 24 * 3600
-    except:
-        return False
-
 def get_most_common_violation(violations):
     """Get the most common violation type"""
     if not violations:
@@ -1897,6 +2832,7 @@ def health_check():
         "timestamp": datetime.now().isoformat(),
         "version": "enhanced-proctoring-with-screenshot-detection",
         "connected_clients": len(connected_clients),
+        "student_sessions": len(student_sessions),
         "screenshot_detection_enabled": screenshot_detection_enabled,
         "features": [
             "Screenshot tool detection",
@@ -1928,30 +2864,10 @@ def update_attempts():
         if not exam_id or not student_socket_id:
             return jsonify({"error": "Missing parameters"}), 400
         
-        key = f"{exam_id}_{student_socket_id}"
-        
-        # Get current attempts
-        attempts = student_attempts.get(key, {
-            'current_attempts': 0,
-            'max_attempts': 10,
-            'attempts_left': 10,
-            'violation_history': []
-        })
-        
-        # Deduct attempt
-        attempts['current_attempts'] += 1
-        attempts['attempts_left'] = max(0, attempts['max_attempts'] - attempts['current_attempts'])
-        
-        # Add to history
-        attempts['violation_history'].append({
-            'timestamp': datetime.now().isoformat(),
-            'type': detection_type,
-            'message': message,
-            'attempts_used': attempts['current_attempts'],
-            'attempts_left': attempts['attempts_left']
-        })
-        
-        student_attempts[key] = attempts
+        # Deduct attempt through the shared engine (same severity policy as socket alerts)
+        session = get_student_session(exam_id, student_socket_id)
+        attempts_engine.deduct(f"{exam_id}_{student_socket_id}", session, detection_type, message=message)
+        attempts = attempts_engine.query(f"{exam_id}_{student_socket_id}", session)
         
         # Send to teacher
         room = f"exam-{exam_id}"
@@ -1963,11 +2879,7 @@ def update_attempts():
         }, room=room)
         
         # Send to student
-        sio.emit('attempts-update', {
-            'studentSocketId': student_socket_id,
-            'attempts': attempts,
-            'detectionType': detection_type
-        }, room=student_socket_id)
+        notify_attempts_update(exam_id, student_socket_id, attempts, detection_type)
         
         return jsonify({
             "status": "success",
@@ -1985,7 +2897,7 @@ def test_endpoint():
         "status": "success",
         "features": [
             "Enhanced gaze detection with pupil tracking",
-            "Improved head pose analysis with symmetry checks",
+            "3D head pose estimation (solvePnP yaw/pitch/roll)",
             "Advanced phone detection with multiple factors",
             "Enhanced mouth movement detection",
             "Enhanced audio detection with spectral analysis",
@@ -1999,7 +2911,7 @@ if __name__ == "__main__":
     print("🚀 ENHANCED PROCTORING Server Running...")
     print("📡 ENHANCED Features:")
     print("   • Improved gaze detection with pupil tracking")
-    print("   • Enhanced head pose analysis with symmetry checks")
+    print("   • 3D head pose estimation with solvePnP (yaw/pitch/roll)")
     print("   • Advanced phone detection with multiple confidence factors")
     print("   • Better mouth movement detection with multiple metrics")
     print("   • Enhanced audio detection with spectral analysis")
@@ -2008,6 +2920,9 @@ if __name__ == "__main__":
     print("   • Image quality enhancement for better detection")
     print("   • Multiple people detection with position analysis")
     print("   • ALL DETECTION TYPES DEDUCT ATTEMPTS AUTOMATICALLY")
+    start_session_sweeper()
+    start_attempts_notifier()
+    start_audio_scheduler()
 <<<<<<< HEAD
     print("🌐 Access the server at: http://localhost:5000")
     eventlet.wsgi.server(eventlet.listen(('0.0.0.0', 5000)), app_socket)
@@ -0,0 +1,697 @@
+"""Compact per-student state containers used by the proctoring server"""
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from datetime import datetime
+
+import numpy as np
+
+# Bit flags stored per frame in DetectionHistory
+FLAG_FACE = 1
+FLAG_MULTIPLE_PEOPLE = 2
+FLAG_GAZE_AWAY = 4
+FLAG_HEAD_TURNED = 8
+FLAG_MOUTH_MOVING = 16
+FLAG_SUSPICIOUS = 32
+
+# Bounded event histories kept per student
+VIOLATION_HISTORY_SIZE = 50
+TAB_HISTORY_SIZE = 20
+
+
+class DetectionHistory:
+    """Fixed-size ring buffer of frame summaries (flags, face count, timestamp) for one student"""
+
+    __slots__ = ('size', 'flags', 'face_counts', 'timestamps', 'head', 'count')
+
+    def __init__(self, size=50):
+        self.size = size
+        self.flags = np.zeros(size, dtype=np.uint8)
+        self.face_counts = np.zeros(size, dtype=np.uint8)
+        self.timestamps = np.zeros(size, dtype=np.float64)
+        self.head = 0  # Next write position
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def push(self, flags, face_count=0, timestamp=None):
+        """Record one frame summary in O(1), overwriting the oldest slot when full"""
+        i = self.head
+        self.flags[i] = flags
+        self.face_counts[i] = min(face_count, 255)
+        self.timestamps[i] = time.time() if timestamp is None else timestamp
+        self.head = (i + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def _recent_indices(self, n):
+        n = min(n, self.count)
+        return (self.head - 1 - np.arange(n)) % self.size
+
+    def recent_flags(self, n):
+        """Flags of the last n frames, newest first"""
+        return self.flags[self._recent_indices(n)]
+
+    def count_recent(self, flag, n=5, present=True):
+        """How many of the last n frames have (or lack, if present=False) the given flag"""
+        hits = (self.recent_flags(n) & flag) != 0
+        return int(np.count_nonzero(hits if present else ~hits))
+
+    def count_since(self, flag, seconds, present=True, now=None):
+        """How many frames in the last `seconds` have (or lack) the given flag"""
+        if not self.count:
+            return 0
+        now = time.time() if now is None else now
+        idx = self._recent_indices(self.count)
+        in_window = self.timestamps[idx] >= now - seconds
+        hits = (self.flags[idx] & flag) != 0
+        return int(np.count_nonzero(in_window & (hits if present else ~hits)))
+
+    def last_timestamp(self):
+        """Timestamp of the newest frame, or None if empty"""
+        if not self.count:
+            return None
+        return float(self.timestamps[(self.head - 1) % self.size])
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+
+class SignalSmoother:
+    """EWMA + hysteresis + minimum dwell time for a fixed set of per-frame signals
+
+    A signal becomes active once its smoothed value stays at or above `on` for
+    `dwell` seconds, and clears when it drops below `off`. update() reports a
+    firing only on activation and then at most once per `refire` seconds while
+    the signal stays active, so brief jitter never produces an alert.
+    """
+
+    __slots__ = ('alpha', 'on', 'off', 'dwell', 'refire', 'value', 'seen', 'active', 'above_since', 'last_fired')
+
+    def __init__(self, alpha, on, off, dwell, refire):
+        self.alpha = np.asarray(alpha, dtype=np.float32)
+        self.on = np.asarray(on, dtype=np.float32)
+        self.off = np.asarray(off, dtype=np.float32)
+        self.dwell = np.asarray(dwell, dtype=np.float32)
+        self.refire = np.asarray(refire, dtype=np.float32)
+        k = len(self.alpha)
+        self.value = np.zeros(k, dtype=np.float32)
+        self.seen = np.zeros(k, dtype=bool)
+        self.active = np.zeros(k, dtype=bool)
+        self.above_since = np.full(k, np.nan)
+        self.last_fired = np.full(k, -np.inf)
+
+    def update(self, i, x, now=None):
+        """Feed one raw value for signal i; returns (smoothed, active, fired)"""
+        now = time.time() if now is None else now
+        if self.seen[i]:
+            value = self.alpha[i] * x + (1 - self.alpha[i]) * self.value[i]
+        else:
+            value = x
+            self.seen[i] = True
+        self.value[i] = value
+
+        fired = False
+        if self.active[i]:
+            if value < self.off[i]:
+                self.active[i] = False
+                self.above_since[i] = np.nan
+            elif now - self.last_fired[i] >= self.refire[i]:
+                fired = True
+        elif value >= self.on[i]:
+            if np.isnan(self.above_since[i]):
+                self.above_since[i] = now
+            if now - self.above_since[i] >= self.dwell[i]:
+                self.active[i] = True
+                fired = True
+        else:
+            self.above_since[i] = np.nan
+
+        if fired:
+            self.last_fired[i] = now
+        return float(value), bool(self.active[i]), fired
+
+    def reset(self, i):
+        """Forget signal i (e.g. when its detector is disabled)"""
+        self.seen[i] = False
+        self.active[i] = False
+        self.value[i] = 0
+        self.above_since[i] = np.nan
+
+
+# Last fully analysed frame of a student, reused for near-duplicate frames
+AnalyzedFrame = namedtuple('AnalyzedFrame', ['signature', 'results', 'flags', 'face_count', 'plan', 'analyzed_at'])
+
+
+# What one gated detector stage added to a frame's results, replayed when motion gating skips it
+StageOutput = namedtuple('StageOutput', ['fields', 'features', 'activities', 'signals', 'plan', 'produced_at'])
+
+
+# Capture settings the server last recommended to a student's client
+SamplingPlan = namedtuple('SamplingPlan', ['interval_ms', 'width', 'quality'])
+
+
+class BucketedCounter:
+    """Event counts in a ring of fixed-width time buckets (epoch seconds, no string parsing)"""
+
+    __slots__ = ('width', 'counts', 'stamps')
+
+    def __init__(self, width, buckets):
+        self.width = width
+        self.counts = np.zeros(buckets, dtype=np.int32)
+        self.stamps = np.full(buckets, -1, dtype=np.int64)  # Absolute bucket number held by each slot
+
+    def add(self, timestamp, n=1):
+        """Count n events at epoch `timestamp` in O(1)"""
+        bucket = int(timestamp // self.width)
+        i = bucket % len(self.counts)
+        if self.stamps[i] != bucket:
+            self.stamps[i] = bucket  # Slot held an expired bucket - start it over
+            self.counts[i] = 0
+        self.counts[i] += n
+
+    def count_since(self, seconds, now=None):
+        """Events in the last `seconds`, at bucket granularity
+
+        The partial current bucket plus ceil(seconds / width) whole buckets before it, so the window
+        is always fully covered and may include up to one extra bucket of older events.
+        """
+        now = time.time() if now is None else now
+        current = int(now // self.width)
+        oldest = current - int(np.ceil(seconds / self.width))
+        live = (self.stamps >= oldest) & (self.stamps <= current)
+        return int(self.counts[live].sum())
+
+
+class VolumeHistory:
+    """Rolling per-student RMS volume history, shared by the HTTP and streaming audio paths"""
+
+    __slots__ = ('volumes', 'head', 'count')
+
+    def __init__(self, size=100):
+        self.volumes = np.zeros(size, dtype=np.float32)
+        self.head = 0
+        self.count = 0
+
+    def record(self, volume):
+        """Add one RMS volume in O(1)"""
+        self.volumes[self.head] = volume
+        self.head = (self.head + 1) % len(self.volumes)
+        if self.count < len(self.volumes):
+            self.count += 1
+
+    def stats(self):
+        """Mean and peak of the rolling volume history"""
+        if not self.count:
+            return {"mean": 0.0, "max": 0.0, "samples": 0}
+        recent = self.volumes[:self.count]
+        return {"mean": float(recent.mean()), "max": float(recent.max()), "samples": self.count}
+
+
+class AudioStream:
+    """Per-student PCM ring buffer with sliding-window reads
+
+    Samples are written into a preallocated int16 buffer; windows() yields each
+    complete `window`-sample frame exactly once, stepping by `hop` samples, so
+    features are computed incrementally as audio streams in.
+    """
+
+    __slots__ = ('sample_rate', 'pcm', 'written', 'next_start', 'adpcm_state')
+
+    def __init__(self, sample_rate=16000, seconds=4.0):
+        self.sample_rate = sample_rate
+        self.pcm = np.zeros(int(sample_rate * seconds), dtype=np.int16)
+        self.written = 0  # Total samples ever written (absolute position)
+        self.next_start = 0  # Absolute position of the next window to analyse
+        self.adpcm_state = None  # IMA ADPCM decoder state carried between streamed chunks
+
+    def write(self, samples):
+        """Append int16 samples, overwriting the oldest audio when the buffer is full"""
+        capacity = len(self.pcm)
+        if len(samples) > capacity:
+            self.written += len(samples) - capacity  # Oldest samples are overwritten immediately
+            samples = samples[-capacity:]
+        start = self.written % capacity
+        first = min(len(samples), capacity - start)
+        self.pcm[start:start + first] = samples[:first]
+        self.pcm[:len(samples) - first] = samples[first:]
+        self.written += len(samples)
+
+    def read(self, start, length):
+        """Copy `length` samples starting at absolute position `start`"""
+        capacity = len(self.pcm)
+        offset = start % capacity
+        if offset + length <= capacity:
+            return self.pcm[offset:offset + length].copy()
+        return np.concatenate((self.pcm[offset:], self.pcm[:offset + length - capacity]))
+
+    def windows(self, window, hop):
+        """Yield every not-yet-analysed complete window of `window` samples, `hop` apart"""
+        oldest = self.written - len(self.pcm)
+        if self.next_start < oldest:
+            self.next_start = oldest  # Fell behind: skip audio that was already overwritten
+        while self.next_start + window <= self.written:
+            yield self.read(self.next_start, window)
+            self.next_start += hop
+
+
+# ==================== DETECTION PLANS ====================
+DetectionPlan = namedtuple('DetectionPlan', [
+    'face', 'gaze', 'head_pose', 'mouth', 'multiple_people', 'phone', 'hand_gesture', 'audio',
+    'screenshot', 'tab_switch', 'any_stage', 'hands_pose', 'attention_alert',
+    'attention_threshold', 'speaking_cooldown', 'whispering_cooldown', 'screenshot_cooldown'
+])
+
+_compiled_plans = {}  # frozenset(settings.items()) -> DetectionPlan
+MAX_COMPILED_PLANS = 256
+
+
+def _build_detection_plan(settings):
+    """Resolve every settings lookup /detect needs into one DetectionPlan"""
+    enabled = lambda key: bool(settings.get(key, True))
+    face, gaze, mouth = enabled('faceDetection'), enabled('gazeDetection'), enabled('mouthDetection')
+    multiple_people, phone = enabled('multiplePeopleDetection'), enabled('phoneDetection')
+    hand_gesture, audio, screenshot = enabled('handGestureDetection'), enabled('audioDetection'), enabled('screenshotDetection')
+    return DetectionPlan(
+        face=face, gaze=gaze, head_pose=gaze,  # Head pose is tied to gaze
+        mouth=mouth, multiple_people=multiple_people, phone=phone, hand_gesture=hand_gesture,
+        audio=audio, screenshot=screenshot,
+        tab_switch=settings.get('tabSwitchDetection') is not False,  # Only an explicit False disables it
+        any_stage=any((face, gaze, phone, mouth, multiple_people, audio, hand_gesture, screenshot)),
+        hands_pose=phone or hand_gesture,
+        attention_alert=gaze or phone or multiple_people,
+        attention_threshold=settings.get('attentionThreshold', 70),
+        speaking_cooldown=settings.get('speakingCooldown', 30),
+        whispering_cooldown=settings.get('whisperingCooldown', 20),  # Shorter cooldown for whispering
+        screenshot_cooldown=settings.get('screenshotCooldown', 30)
+    )
+
+
+def compile_detection_plan(settings):
+    """Immutable per-frame execution plan for a settings dict, compiled once per distinct settings"""
+    settings = settings or {}
+    try:
+        key = frozenset(settings.items())
+    except TypeError:
+        return _build_detection_plan(settings)  # Unhashable values - compile without caching
+    plan = _compiled_plans.get(key)
+    if plan is None:
+        if len(_compiled_plans) >= MAX_COMPILED_PLANS:
+            _compiled_plans.clear()
+        plan = _compiled_plans[key] = _build_detection_plan(settings)
+    return plan
+
+
+DEFAULT_DETECTION_PLAN = compile_detection_plan({})
+
+
+class StudentSession:
+    """Proctoring state for one client socket: settings, frame stats, attempts and tab switches"""
+
+    __slots__ = (
+        'sid', 'exam_id', 'user_role', 'connected_at', 'last_seen', 'settings', 'plan', 'settings_version',
+        'audio_alerts', 'screenshot_alerts', 'last_audio_alert', 'last_screenshot_alert',
+        'total_frames', 'face_detected_count', 'history', 'history_size', 'smoother', 'pose_guess', 'audio', 'volumes',
+        'screenshot_job', 'screenshot_checked_at', 'screen_tiles', 'screen_job', 'last_frame',
+        'motion_background', 'stage_outputs', 'sampling',
+        'current_attempts', 'max_attempts', 'attempts_left',
+        'last_violation_time', 'last_updated', 'violation_history',
+        'tab_switch_count', 'last_switch_time', 'tab_history', 'tab_minutes', 'tab_hours'
+    )
+
+    def __init__(self, sid, exam_id=None, max_attempts=10, history_size=50):
+        self.sid = sid
+        self.exam_id = exam_id
+        self.user_role = None
+        self.connected_at = time.time()
+        self.last_seen = self.connected_at
+        self.settings = {}
+        self.plan = DEFAULT_DETECTION_PLAN
+        self.settings_version = None  # Version of the exam-wide settings document last applied
+
+        self.audio_alerts = 0
+        self.screenshot_alerts = 0
+        self.last_audio_alert = None
+        self.last_screenshot_alert = None
+
+        self.total_frames = 0
+        self.face_detected_count = 0
+        self.history = None  # Allocated on the first analysed frame
+        self.history_size = history_size
+        self.smoother = None  # SignalSmoother, allocated on the first analysed frame
+        self.pose_guess = None  # Last solvePnP (rvec, tvec), seeds the next head pose solve
+        self.audio = None  # AudioStream, allocated when the student first streams audio
+        self.volumes = None  # VolumeHistory, allocated on the first analysed audio
+        self.screenshot_job = None  # Future of the in-flight background screenshot check
+        self.screenshot_checked_at = 0.0
+        self.screen_tiles = None  # Tile signatures of the last analysed screen-share frame
+        self.screen_job = None  # Future of the in-flight screen-share region analysis
+        self.last_frame = None  # AnalyzedFrame of the last fully analysed webcam frame
+        self.motion_background = None  # Low-res float32 EWMA background for the motion stage
+        self.stage_outputs = {}  # Stage name -> StageOutput of its last run
+        self.sampling = None  # SamplingPlan last pushed to the client
+
+        self.current_attempts = 0
+        self.max_attempts = max_attempts
+        self.attempts_left = max_attempts
+        self.last_violation_time = None
+        self.last_updated = None
+        self.violation_history = deque(maxlen=VIOLATION_HISTORY_SIZE)
+
+        self.tab_switch_count = 0
+        self.last_switch_time = None
+        self.tab_history = deque(maxlen=TAB_HISTORY_SIZE)
+        self.tab_minutes = None  # BucketedCounter: per-minute buckets covering the last hour
+        self.tab_hours = None  # BucketedCounter: per-hour buckets covering the last day
+
+    def apply_settings(self, settings, plan=None, version=None):
+        """Store detection settings together with their compiled plan"""
+        self.settings = settings
+        self.plan = plan if plan is not None else compile_detection_plan(settings)
+        self.settings_version = version
+
+    def detection_history(self):
+        """Get the frame history ring buffer, allocating it on first use"""
+        if self.history is None:
+            self.history = DetectionHistory(self.history_size)
+        return self.history
+
+    def audio_stream(self, sample_rate=16000):
+        """Get the audio ring buffer, (re)allocating it on first use or when the sample rate changes"""
+        if self.audio is None or self.audio.sample_rate != sample_rate:
+            self.audio = AudioStream(sample_rate)
+        return self.audio
+
+    def volume_history(self):
+        """Get the rolling volume history, allocating it on first use"""
+        if self.volumes is None:
+            self.volumes = VolumeHistory()
+        return self.volumes
+
+    def free_frame_state(self):
+        """Release per-frame buffers (called when the socket disconnects)"""
+        self.history = None
+        self.smoother = None
+        self.pose_guess = None
+        self.audio = None
+        self.volumes = None
+        self.screenshot_job = None
+        self.screen_tiles = None
+        self.screen_job = None
+        self.last_frame = None
+        self.motion_background = None
+        self.stage_outputs = {}
+        self.sampling = None
+
+    def attempts_snapshot(self):
+        """Attempts in the dict shape the frontend expects"""
+        return {
+            'current_attempts': self.current_attempts,
+            'max_attempts': self.max_attempts,
+            'attempts_left': self.attempts_left,
+            'violation_history': list(self.violation_history),
+            'last_violation_time': self.last_violation_time,
+            'last_updated': self.last_updated
+        }
+
+    def load_attempts(self, attempts_data):
+        """Overwrite attempts from a teacher-supplied camelCase payload"""
+        self.current_attempts = attempts_data.get('currentAttempts', 0)
+        self.max_attempts = attempts_data.get('maxAttempts', 10)
+        self.attempts_left = attempts_data.get('attemptsLeft', 10)
+        self.violation_history = deque(attempts_data.get('history') or (), maxlen=VIOLATION_HISTORY_SIZE)
+        self.last_updated = datetime.now().isoformat()
+
+    def record_tab_switch(self, timestamp=None):
+        """Count one tab switch at epoch `timestamp` in the minute and hour buckets"""
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.tab_minutes is None:
+            self.tab_minutes = BucketedCounter(60, 61)  # An hour plus the partial current minute
+            self.tab_hours = BucketedCounter(3600, 25)  # A day plus the partial current hour
+        self.tab_minutes.add(timestamp)
+        self.tab_hours.add(timestamp)
+
+    def recent_tab_switches(self, seconds, now=None):
+        """Tab switches in the last `seconds` (minute buckets up to an hour, hour buckets up to a day)"""
+        if self.tab_minutes is None:
+            return 0
+        counter = self.tab_minutes if seconds <= 3600 else self.tab_hours
+        return counter.count_since(seconds, now)
+
+    def tab_switch_snapshot(self, last=None):
+        """Tab switch history as a list (oldest first), optionally only the last N entries"""
+        history = list(self.tab_history)
+        return history[-last:] if last else history
+
+
+# ==================== ATTEMPTS ENGINE ====================
+MAJOR_VIOLATIONS = frozenset([
+    'tab_switching',
+    'multiple_people',
+    'no_face_detected',
+    'multiple_screen_indicators',
+    'speaking_detected',
+    'loud_noise_detected',
+    'low_attention_score'
+])
+
+MINOR_VIOLATIONS = frozenset([
+    'gaze_deviation', 'head_pose_deviation', 'mouth_movement',
+    'mouse_usage', 'suspicious_gesture', 'audio_detection'
+])
+
+
+def default_severity_policy(detection_type, alert_data=None):
+    """Full attempt for major violations, half an attempt for everything else"""
+    if detection_type in MAJOR_VIOLATIONS:
+        return 1.0
+    return 0.5
+
+
+def flat_severity_policy(detection_type, alert_data=None):
+    """One attempt per violation regardless of type"""
+    return 1.0
+
+
+class AttemptsEngine:
+    """Atomic attempt deduction shared by the socket and HTTP paths
+
+    Each session key maps onto one of a fixed set of locks (lock striping), so
+    concurrent frames for different students rarely contend while updates for
+    the same student are serialized. Student notifications are coalesced: only
+    the latest attempts state per student is kept until the next flush.
+    """
+
+    def __init__(self, stripes=64, severity_policy=default_severity_policy):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self.severity_policy = severity_policy
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+    def _lock_for(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+    def deduct(self, key, session, detection_type, message='', severity='medium', alert_data=None, amount=None):
+        """Deduct attempts for one violation and return the resulting state"""
+        if amount is None:
+            amount = self.severity_policy(detection_type, alert_data)
+        now_iso = datetime.now().isoformat()
+        with self._lock_for(key):
+            session.current_attempts += amount
+            session.attempts_left = max(0, session.max_attempts - session.current_attempts)
+            session.last_violation_time = now_iso
+            session.violation_history.append({
+                'timestamp': now_iso,
+                'type': detection_type,
+                'message': message,
+                'severity': severity,
+                'attempts_used': session.current_attempts,
+                'attempts_left': session.attempts_left,
+                'deducted': amount
+            })
+            return {
+                'current_attempts': session.current_attempts,
+                'max_attempts': session.max_attempts,
+                'attempts_left': session.attempts_left,
+                'violation_count': len(session.violation_history),
+                'deducted': amount,
+                'exhausted': session.attempts_left <= 0
+            }
+
+    def query(self, key, session):
+        """Consistent snapshot of a session's attempts"""
+        with self._lock_for(key):
+            return session.attempts_snapshot()
+
+    def reset(self, key, session, max_attempts=None):
+        """Restore a session to a full set of attempts"""
+        with self._lock_for(key):
+            if max_attempts is not None:
+                session.max_attempts = max_attempts
+            session.current_attempts = 0
+            session.attempts_left = session.max_attempts
+            session.last_violation_time = None
+            session.violation_history.clear()
+            session.last_updated = datetime.now().isoformat()
+            return session.attempts_snapshot()
+
+    def load(self, key, session, attempts_data):
+        """Overwrite a session's attempts from a teacher payload"""
+        with self._lock_for(key):
+            session.load_attempts(attempts_data)
+            return session.attempts_snapshot()
+
+    def queue_update(self, key, payload):
+        """Queue an attempts-update for a student, replacing any unsent one"""
+        with self._pending_lock:
+            self._pending[key] = payload
+
+    def drain_updates(self):
+        """Take all queued attempts-update payloads"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        return list(pending.values())
+
+
+class ExamStatusAggregate:
+    """Per-exam dashboard rows (one per student), maintained incrementally
+
+    Every change bumps the version and stamps the changed row with it, so
+    snapshot(since=v) returns only the rows changed after version v. Updates
+    that do not change any field do not bump the version. Versions come from
+    one counter for all exams, so they keep increasing when an exam is
+    discarded and rebuilt; a `since` from before the rebuild gets a full snapshot.
+    """
+
+    def __init__(self):
+        self._exams = {}  # exam_id -> {'version', 'created', 'rows', 'row_versions', 'removed'}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _bump(self, exam):
+        self._version += 1
+        exam['version'] = self._version
+        return self._version
+
+    def update(self, exam_id, student_socket_id, **fields):
+        """Merge fields into a student's row; returns the exam's version"""
+        with self._lock:
+            exam = self._exams.get(exam_id)
+            if exam is None:
+                exam = self._exams[exam_id] = {
+                    'version': self._version, 'created': self._version, 'rows': {}, 'row_versions': {}, 'removed': {}
+                }
+            row = exam['rows'].get(student_socket_id)
+            if row is None:
+                row = exam['rows'][student_socket_id] = {}
+            elif all(row.get(name) == value for name, value in fields.items()):
+                return exam['version']
+            row.update(fields)
+            exam['row_versions'][student_socket_id] = self._bump(exam)
+            exam['removed'].pop(student_socket_id, None)
+            return exam['version']
+
+    def remove(self, exam_id, student_socket_id):
+        """Drop a student's row, remembering the removal for delta queries"""
+        with self._lock:
+            exam = self._exams.get(exam_id)
+            if exam is None or exam['rows'].pop(student_socket_id, None) is None:
+                return
+            exam['row_versions'].pop(student_socket_id, None)
+            exam['removed'][student_socket_id] = self._bump(exam)
+
+    def snapshot(self, exam_id, since=None):
+        """All rows, or only rows changed/removed after version `since`"""
+        with self._lock:
+            exam = self._exams.get(exam_id)
+            if exam is None:
+                return {'version': self._version, 'full': True, 'students': {}, 'removed': []}
+            if since is not None and since <= exam['created']:
+                since = None  # Version from before the exam was discarded and rebuilt - resync
+            if since is None:
+                students = {sid: dict(row) for sid, row in exam['rows'].items()}
+                removed = []
+            else:
+                students = {
+                    sid: dict(exam['rows'][sid])
+                    for sid, version in exam['row_versions'].items() if version > since
+                }
+                removed = [sid for sid, version in exam['removed'].items() if version > since]
+            return {'version': exam['version'], 'full': since is None, 'students': students, 'removed': removed}
+
+    def discard(self, exam_id):
+        with self._lock:
+            self._exams.pop(exam_id, None)
+
+
+# ==================== SCREEN ANALYSIS CACHES ====================
+def score_screenshot_tools(color_pixels, selection_boxes, frame_pixels):
+    """(detected, confidence) from tool-overlay evidence measured against the whole frame
+
+    color_pixels maps each overlay color to its full-resolution pixel count; selection_boxes counts
+    rectangular selection outlines. Both may be summed over several regions of one frame.
+    """
+    indicators = [pixels / frame_pixels for pixels in color_pixels.values() if pixels / frame_pixels > 0.01]
+    if selection_boxes > 0:
+        indicators.append(min(1.0, selection_boxes * 0.3))
+    if not indicators:
+        return False, 0.0
+    return True, min(sum(indicators) / len(indicators), 1.0)
+
+
+class RegionResultCache:
+    """Thread-safe LRU of analysis results keyed by a region's content hash"""
+
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+
+class RateLimiter:
+    """Per-key token buckets: `rate` tokens per second, bursts of up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # key -> [tokens, last refill time]
+        self._lock = threading.Lock()
+
+    def allow(self, key, cost=1.0, now=None):
+        """Take `cost` tokens from key's bucket if available"""
+        now = time.time() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < cost:
+                return False
+            bucket[0] -= cost
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
@@ -0,0 +1,145 @@
+"""Tests for the pure helpers in proctoring_state. Run with: python -m pytest -q test_proctoring_state.py"""
+import numpy as np
+
+from proctoring_state import (
+    AttemptsEngine, AudioStream, BucketedCounter, ExamStatusAggregate, SignalSmoother, StudentSession,
+    score_screenshot_tools
+)
+
+FRAME_PIXELS = 1280 * 720
+
+
+def test_small_widget_in_dirty_region_scored_against_full_frame():
+    # A tile-aligned 128x64 green button redrawn on screen, its outline counted as one selection box
+    color_pixels = {"green_tool_overlay": 128 * 64}
+
+    _, confidence = score_screenshot_tools(color_pixels, 1, FRAME_PIXELS)
+    assert confidence <= 0.5  # Below the alert cutoff: no violation, no attempt deducted
+
+    # Scored against the region alone, the same widget crossed the cutoff
+    _, region_confidence = score_screenshot_tools(color_pixels, 1, 128 * 64)
+    assert region_confidence > 0.5
+
+
+def test_large_overlay_still_detected():
+    detected, confidence = score_screenshot_tools({"blue_tool_overlay": FRAME_PIXELS * 0.6}, 2, FRAME_PIXELS)
+    assert detected and confidence > 0.5
+
+
+def test_no_evidence():
+    assert score_screenshot_tools({"green_tool_overlay": 0}, 0, FRAME_PIXELS) == (False, 0.0)
+
+
+def test_bucketed_count_covers_whole_window():
+    counter = BucketedCounter(60, 61)
+    now = 1_000_000 * 60 + 5  # 5 s into a minute bucket
+    counter.add(now - 250)  # 4m10s ago, in the bucket five minutes back
+    assert counter.count_since(300, now) == 1
+
+
+def test_bucketed_count_drops_expired_buckets():
+    counter = BucketedCounter(60, 61)
+    now = 1_000_000 * 60 + 20
+    counter.add(now - 400)
+    assert counter.count_since(300, now) == 0
+    assert counter.count_since(3600, now) == 1
+
+
+def test_recent_tab_switches_full_hour_and_day():
+    session = StudentSession('sid', 'exam')
+    now = 1_000_000 * 3600 + 1800
+    session.record_tab_switch(now - 3590)
+    session.record_tab_switch(now - 86000)
+    assert session.recent_tab_switches(3600, now) == 1
+    assert session.recent_tab_switches(86400, now) == 2
+
+
+def test_exam_status_since_before_rebuild_gets_full_snapshot():
+    status = ExamStatusAggregate()
+    status.update('exam', 'a', score=90)
+    stale = status.snapshot('exam')['version']
+    status.discard('exam')
+    status.update('exam', 'b', score=80)  # Rebuilt exam: fewer changes than before the discard
+
+    snapshot = status.snapshot('exam', since=stale)
+    assert snapshot['full'] and snapshot['students'] == {'b': {'score': 80}}
+    assert snapshot['version'] > stale
+
+    status.update('exam', 'c', score=70)
+    delta = status.snapshot('exam', since=snapshot['version'])
+    assert not delta['full'] and list(delta['students']) == ['c']
+
+
+def test_exam_status_noop_update_keeps_version():
+    status = ExamStatusAggregate()
+    version = status.update('exam', 'a', score=90, face=True)
+    assert status.update('exam', 'a', score=90) == version
+
+    delta = status.snapshot('exam', since=version)
+    assert delta['version'] == version and delta['students'] == {}
+
+
+def test_exam_status_delta_lists_removed_rows():
+    status = ExamStatusAggregate()
+    version = status.update('exam', 'a', score=90)
+    status.update('exam', 'b', score=80)
+    status.remove('exam', 'a')
+
+    delta = status.snapshot('exam', since=version)
+    assert delta['removed'] == ['a'] and list(delta['students']) == ['b']
+    assert 'a' not in status.snapshot('exam')['students']
+
+
+def test_audio_stream_wraps_around():
+    stream = AudioStream(sample_rate=4, seconds=2.0)  # 8-sample ring
+    stream.write(np.arange(6, dtype=np.int16))
+    stream.write(np.arange(6, 12, dtype=np.int16))
+
+    assert stream.read(6, 4).tolist() == [6, 7, 8, 9]  # Spans the end of the buffer
+    # Samples 0-3 were overwritten, so windows start at the oldest retained sample
+    assert [w.tolist() for w in stream.windows(4, 2)] == [[4, 5, 6, 7], [6, 7, 8, 9], [8, 9, 10, 11]]
+
+    stream.write(np.arange(12, 14, dtype=np.int16))
+    assert [w.tolist() for w in stream.windows(4, 2)] == [[10, 11, 12, 13]]
+
+
+def test_audio_stream_oversized_write_keeps_newest():
+    stream = AudioStream(sample_rate=4, seconds=2.0)
+    stream.write(np.arange(20, dtype=np.int16))
+    assert stream.written == 20
+    assert stream.read(12, 8).tolist() == list(range(12, 20))
+
+
+def test_signal_smoother_dwell_and_refire():
+    smoother = SignalSmoother([1.0], on=[0.5], off=[0.3], dwell=[2.0], refire=[5.0])  # alpha 1: no smoothing
+    assert smoother.update(0, 0.8, now=0)[1:] == (False, False)
+    assert smoother.update(0, 0.8, now=1)[1:] == (False, False)
+    assert smoother.update(0, 0.8, now=2)[1:] == (True, True)  # Held for the dwell time
+    assert smoother.update(0, 0.4, now=3)[1:] == (True, False)  # Between off and on: stays active
+    assert smoother.update(0, 0.8, now=7)[1:] == (True, True)  # Refire period elapsed
+    assert smoother.update(0, 0.1, now=8)[1:] == (False, False)
+
+
+def test_signal_smoother_jitter_restarts_dwell():
+    smoother = SignalSmoother([1.0], on=[0.5], off=[0.3], dwell=[2.0], refire=[5.0])
+    smoother.update(0, 0.8, now=0)
+    smoother.update(0, 0.1, now=1)
+    smoother.update(0, 0.8, now=2)
+    assert smoother.update(0, 0.8, now=3)[1:] == (False, False)
+    assert smoother.update(0, 0.8, now=4)[1:] == (True, True)
+
+
+def test_attempts_deduct_by_severity_and_reset():
+    engine = AttemptsEngine(stripes=4)
+    session = StudentSession('sid', 'exam', max_attempts=2)
+
+    minor = engine.deduct('exam_sid', session, 'gaze_deviation')
+    assert minor['deducted'] == 0.5 and minor['attempts_left'] == 1.5 and not minor['exhausted']
+    major = engine.deduct('exam_sid', session, 'multiple_people')
+    assert major['attempts_left'] == 0.5 and major['violation_count'] == 2
+    assert engine.deduct('exam_sid', session, 'tab_switching')['exhausted']
+    assert session.attempts_left == 0
+
+    attempts = engine.reset('exam_sid', session, max_attempts=5)
+    assert attempts['current_attempts'] == 0 and attempts['attempts_left'] == 5
+    assert attempts['violation_history'] == []